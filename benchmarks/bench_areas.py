@@ -0,0 +1,100 @@
+"""Benchmark bitmask area matching against the previous row-by-row search
+
+Usage: python benchmarks/bench_areas.py [n_pairs]
+"""
+import logging
+import sys
+from os.path import abspath, dirname
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from dbmerger.areas import AreaMatcher  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+ID = 'TID'
+CUST_COLS = ['Person Fachgebiet 1', 'Person Fachgebiet 2']
+AREAS = {'Allgemeinmedizin': ['general', ' Hausarzt'], 'Innere Medizin': ['internal', ' Internist'],
+         'Kardiologie': ['cardio'], 'Neurologie': ['neuro'], 'Dermatologie': ['derma', ' Haut'],
+         'Chirurgie': ['surgery', ' Chirurg'], 'Orthopädie': ['ortho'], 'Pädiatrie': ['paediatr', ' Kinder'],
+         'Gynäkologie': ['gyn'], 'Urologie': ['uro'], 'Radiologie': ['radio'], 'Psychiatrie': ['psych'],
+         'Onkologie': ['onco', ' Krebs'], 'Anästhesie': ['anaesth'], 'Augenheilkunde': ['ophthalm', ' Auge'],
+         'Zahnmedizin': ['dental', ' Zahn']}
+# the previous implementation checks each pair in python, so is only run on a sample of pairs
+LEGACY_MAX = 200_000
+
+
+def legacy_search(pairs, prim_cols, alt_areas):
+    """previous Match.match_areas search over merged pairs, kept as the benchmark baseline"""
+
+    def search_areas(row):
+        match = False
+        for cust in CUST_COLS:
+            for area in row['Primary DF Areas']:
+                match = area in row[cust]
+                if len(alt_areas.get(area, [])) > 0:
+                    match = any([match, any([alt in row[cust] for alt in alt_areas[area]])])
+
+                if match:
+                    return match
+        return match
+
+    return pairs.apply(lambda x: search_areas(x), axis=1).to_numpy(dtype=bool)
+
+
+def generate(n_primary, n_customer, n_pairs, seed=0):
+    """build one-hot primary areas, customer free text naming areas by name or alternative name, and pairs of both"""
+    rng = np.random.default_rng(seed)
+    names = list(AREAS)
+
+    one_hot = (rng.random((n_primary, len(names))) < 0.15).astype(np.int64)
+    primary = pd.DataFrame(one_hot, columns=names)
+    primary.insert(0, ID, np.arange(n_primary))
+
+    words = np.array([*names, *[alt.strip() for alts in AREAS.values() for alt in alts], 'Praxis', 'Klinik', ''])
+    cust = pd.DataFrame({col: [', '.join(rng.choice(words, rng.integers(0, 3))) for _ in range(n_customer)]
+                         for col in CUST_COLS})
+
+    pairs = pd.DataFrame({ID: rng.integers(0, n_primary, n_pairs), 'cust_index': rng.integers(0, n_customer, n_pairs)})
+    return primary, cust, pairs
+
+
+def main(n_pairs=1_000_000):
+    n_primary, n_customer = n_pairs, n_pairs // 10
+    print(f'Area matching: {n_pairs} candidate pairs, {n_primary} primary rows, {n_customer} customer rows')
+    primary, cust, pairs = generate(n_primary, n_customer, n_pairs)
+
+    # previous list encoding and row-by-row search, on a sample
+    sample = pairs.iloc[:LEGACY_MAX]
+    time = perf_counter()
+    prim_areas = primary.set_index(ID)
+    prim_areas = prim_areas.apply(lambda row: [i * col for i, col in zip(row, AREAS) if i != 0], axis=1)
+    prim_areas = prim_areas.rename('Primary DF Areas').to_frame().reset_index()
+    merged = sample.merge(prim_areas, on=ID, how='left')
+    merged = merged.join(cust, on='cust_index')
+    legacy = legacy_search(merged, list(AREAS), AREAS)
+    legacy_time = perf_counter() - time
+
+    time = perf_counter()
+    areas = AreaMatcher(AREAS)
+    prim_bits = areas.encode(primary)
+    cust_bits = areas.search(cust)
+    encode = perf_counter() - time
+
+    time = perf_counter()
+    found = areas.matches(prim_bits[pairs[ID].to_numpy()], cust_bits[pairs['cust_index'].to_numpy()])
+    match = perf_counter() - time
+
+    same = (found[:LEGACY_MAX] == legacy).all()
+    print(f"{'stage':>16} {'pairs':>9} {'time (s)':>9} {'matched':>9}")
+    print(f"{'legacy':>16} {len(sample):>9} {legacy_time:>9.3f} {legacy.sum():>9}")
+    print(f"{'bitmask encode':>16} {'':>9} {encode:>9.3f} {'':>9}")
+    print(f"{'bitmask match':>16} {n_pairs:>9} {match:>9.3f} {found.sum():>9}")
+    print(f'Results identical to legacy on sample: {same}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
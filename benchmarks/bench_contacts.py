@@ -0,0 +1,83 @@
+"""Benchmark the long-format contact matching engine against the previous per-column loop
+
+Usage: python benchmarks/bench_contacts.py [n_pairs]
+"""
+import logging
+import sys
+from os.path import abspath, dirname
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from dbmerger.contacts import get_status, match_pairs  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+ID = 'TID'
+
+
+def legacy_match_idx(matches, prim_col, cust_col, same_idx, diff_idx, none_idx):
+    """previous Match.get_match_idx implementation, kept as the benchmark baseline"""
+    for col in cust_col:
+        match_drop = matches[~matches[ID].isin(same_idx)]
+        same = match_drop[match_drop[prim_col].isin(match_drop[col]).any(1)]
+        diff = match_drop[(~match_drop[prim_col].isin(match_drop[col]).any(1)) &
+                          (~match_drop[[col] + prim_col].isna().all(1))]
+        none = match_drop[match_drop[[col] + prim_col].isna().all(1)]
+
+        same_idx = same_idx | set(same[ID])
+        diff_idx = (diff_idx | set(diff[ID])) - same_idx
+        none_idx = (none_idx | set(none[ID])) - same_idx - diff_idx
+
+    return same_idx, diff_idx, none_idx
+
+
+def generate(n_pairs, n_cols, seed=0):
+    """build a matches frame with n_cols contact columns split evenly between primary and customer"""
+    rng = np.random.default_rng(seed)
+    n_prim = n_cols // 2
+    n_cust = n_cols - n_prim
+
+    matches = pd.DataFrame({ID: np.arange(n_pairs), 'cust_index': rng.permutation(n_pairs)})
+    values = rng.integers(10 ** 6, 10 ** 8, size=(n_pairs, n_prim)).astype(float)
+    values[rng.random(values.shape) < 0.5] = np.nan
+    prim_col = [f'prim_{i}' for i in range(n_prim)]
+    matches[prim_col] = values
+
+    # roughly a third of customer values copy a primary value from the same row
+    cust = rng.integers(10 ** 6, 10 ** 8, size=(n_pairs, n_cust)).astype(float)
+    copy = rng.random(cust.shape) < 0.3
+    cust[copy] = values[:, rng.integers(0, n_prim, size=n_cust)][copy]
+    cust[rng.random(cust.shape) < 0.5] = np.nan
+    cust_col = [f'cust_{i}' for i in range(n_cust)]
+    matches[cust_col] = cust
+
+    return matches, prim_col, cust_col
+
+
+def run_engine(matches, prim_col, cust_col):
+    same, present = match_pairs(matches, prim_col, cust_col)
+    return get_status(matches[ID], same, present)
+
+
+def main(n_pairs=100_000):
+    print(f'Contact matching: {n_pairs} matched pairs')
+    print(f"{'columns':>8} {'loop (s)':>10} {'engine (s)':>11} {'speedup':>8}")
+    for n_cols in (10, 20, 30, 40):
+        matches, prim_col, cust_col = generate(n_pairs, n_cols)
+
+        time = perf_counter()
+        legacy_match_idx(matches, prim_col, cust_col, set(), set(), set())
+        loop = perf_counter() - time
+
+        time = perf_counter()
+        run_engine(matches, prim_col, cust_col)
+        engine = perf_counter() - time
+
+        print(f'{n_cols:>8} {loop:>10.3f} {engine:>11.3f} {loop / engine:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,88 @@
+"""Benchmark hash-based subsumption dedup against the previous row-by-row implementation
+
+Usage: python benchmarks/bench_dedupe.py [max_rows]
+"""
+import logging
+import sys
+from os.path import abspath, dirname
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from dbmerger.dedupe import subsumed  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+# the previous implementation compares every row against the whole array, so is only run on small inputs
+LEGACY_MAX = 5_000
+
+
+def legacy_drop_dupes(arr):
+    """previous Data.drop_dupes check for one data type, kept as the benchmark baseline"""
+
+    def check_dupes(data):
+        nans = np.isnan(arr)
+        matches = (arr == data)
+        rows = np.where((matches + nans).all(1) * ~nans.all(1))[0]
+
+        if len(rows) > 1 and all(row not in drop for row in rows):
+            def nunique(a):
+                return len(set(a[~np.isnan(a)]))
+
+            count = np.apply_along_axis(nunique, 1, arr)
+            drop.extend([v for k, v in zip(count, rows) if k != max(count)])
+
+            return [False] * len(data)
+        return [True] * len(data)
+
+    drop = []
+    np.apply_along_axis(check_dupes, 1, arr)
+    return drop
+
+
+def generate(n_rows, n_cols=3, seed=0):
+    """build phone-like columns where a tenth of rows repeat an earlier row and a tenth copy part of one"""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(10 ** 6, 10 ** 9, size=(n_rows, n_cols)).astype(float)
+    values[rng.random(values.shape) < 0.4] = np.nan
+
+    source = rng.integers(0, n_rows, size=n_rows)
+    repeat = rng.random(n_rows) < 0.1
+    values[repeat] = values[source[repeat]]
+
+    subset = rng.random(n_rows) < 0.1
+    part = values[source[subset]]
+    part[rng.random(part.shape) < 0.5] = np.nan
+    values[subset] = part
+
+    return pd.DataFrame(values, columns=[f'phone_{i}' for i in range(n_cols)])
+
+
+def main(max_rows=5_000_000):
+    sizes = [n for n in (10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000) if n <= max_rows]
+    print(f"{'rows':>10} {'legacy (s)':>11} {'engine (s)':>11} {'dropped':>9}")
+
+    times = []
+    for n_rows in sizes:
+        df = generate(n_rows)
+        legacy = ''
+        if n_rows <= LEGACY_MAX:
+            time = perf_counter()
+            legacy_drop_dupes(df.to_numpy(dtype=float))
+            legacy = f'{perf_counter() - time:.3f}'
+
+        time = perf_counter()
+        drop = subsumed(df)
+        times.append(perf_counter() - time)
+        print(f'{n_rows:>10} {legacy:>11} {times[-1]:>11.3f} {drop.sum():>9}')
+
+    # slope of log time against log rows, 1 for linear and 2 for quadratic scaling
+    if len(sizes) > 1:
+        slope = np.polyfit(np.log(sizes), np.log(times), 1)[0]
+        print(f'Scaling exponent: {slope:.2f}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,86 @@
+"""Benchmark fuzzy name matching against the exact name join
+
+Usage: python benchmarks/bench_fuzzy.py [n_primary] [n_customer]
+"""
+import logging
+import sys
+from os.path import abspath, dirname
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from dbmerger.fuzzy import FuzzyIndex, normalise  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+ID = 'TID'
+NAMES = ['Vorname', 'Nachname']
+FIRST = ['Anna', 'Peter', 'Hans', 'Julia', 'Klaus', 'Maria', 'Thomas', 'Sabine', 'Jörg', 'Jürgen', 'Michael',
+         'Stefan', 'Andreas', 'Ursula', 'Monika', 'Petra', 'Wolfgang', 'Günter', 'Karin', 'Renate']
+STEMS = ['Müller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Meyer', 'Wagner', 'Becker', 'Schulz', 'Hoffmann',
+         'Koch', 'Bauer', 'Richter', 'Klein', 'Wolf', 'Schröder', 'Neumann', 'Schwarz', 'Zimmermann', 'Braun']
+SUFFIXES = ['', 'er', 'mann', 'ke', 'berg', 'bach', 'feld', 'hausen', 'rich', 'stein']
+LETTERS = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+
+
+def generate(n_primary, n_customer, seed=0):
+    """build primary names and customer names copied from primary, half of them with a typo or umlaut spelled out"""
+    rng = np.random.default_rng(seed)
+
+    # combine stems, suffixes, and random letters for a realistic number of unique names
+    first = [f'{name}{letter}' for name in FIRST for letter in ['', *LETTERS]]
+    last = [f'{stem}{suffix}{a}{b}' for stem in STEMS for suffix in SUFFIXES for a in LETTERS for b in LETTERS]
+    primary = pd.DataFrame({ID: np.arange(n_primary),
+                            'Vorname': rng.choice(first, n_primary),
+                            'Nachname': rng.choice(last, n_primary)})
+
+    cust = primary.sample(n_customer, random_state=seed)[NAMES].reset_index(drop=True)
+    cust['cust_index'] = np.arange(n_customer)
+
+    changed = rng.random(n_customer) < 0.5
+    names = cust.loc[changed, 'Nachname'].str.replace('ü', 'ue').str.replace('ö', 'oe').to_numpy()
+    positions = rng.integers(1, 4, size=len(names))
+    typos = rng.choice(LETTERS, len(names))
+    cust.loc[changed, 'Nachname'] = [name[:i] + typo + name[i + 1:] if 'ue' not in name and 'oe' not in name else name
+                                     for name, i, typo in zip(names, positions, typos)]
+    return primary, cust
+
+
+def exact(primary, cust):
+    """clean names as Data.clean_df does and join on them"""
+    prim = primary.copy()
+    cust = cust.copy()
+    for df in (prim, cust):
+        df[NAMES] = df[NAMES].apply(lambda x: x.str.lower()).replace(r"[^a-zA-Z]+", '', regex=True)
+    return pd.merge(prim, cust, on=NAMES, how='inner')
+
+
+def main(n_primary=1_000_000, n_customer=100_000):
+    print(f'Name matching: {n_primary} primary, {n_customer} customer names')
+    primary, cust = generate(n_primary, n_customer)
+
+    time = perf_counter()
+    matches = exact(primary, cust)
+    join = perf_counter() - time
+
+    time = perf_counter()
+    index = FuzzyIndex.build(primary, NAMES, ID)
+    build = perf_counter() - time
+
+    time = perf_counter()
+    fuzzy = index.match(cust, NAMES, 'cust_index', 0.85)
+    match = perf_counter() - time
+
+    found = fuzzy['cust_index'].nunique()
+    normalised = normalise(cust['Nachname']).str.contains('ae|oe|ue').sum()
+    print(f"{'stage':>14} {'time (s)':>9} {'customers matched':>18}")
+    print(f"{'exact join':>14} {join:>9.3f} {matches['cust_index'].nunique():>18}")
+    print(f"{'fuzzy index':>14} {build:>9.3f} {'':>18}")
+    print(f"{'fuzzy match':>14} {match:>9.3f} {found:>18}")
+    print(f'Candidate blocks: {len(index.keys)}  -  Pairs kept: {len(fuzzy)}  -  Names spelled out: {normalised}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
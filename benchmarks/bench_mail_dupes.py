@@ -0,0 +1,125 @@
+"""Benchmark grouped merging of duplicate mailing list entries against the previous per-customer filtering
+
+Usage: python benchmarks/bench_mail_dupes.py [max_rows]
+"""
+import logging
+import re
+import sys
+from os.path import abspath, dirname
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+from dbmerger.export import Export  # noqa: E402
+from dbmerger.phones import PhoneNormaliser  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+TITLE = 'Titel'
+EMAILS = ['E-Mail (beruflich)', 'E-Mail']
+PHONES = ['Telefon-Festnetz (beruflich)', 'Telefon-Mobil (privat)', 'Phone']
+TITLES = ['Dr.', 'Prof. Dr.', 'Dr. med.', 'dr.', 'Dipl. med.', '']
+# the previous implementation filters the whole list once per duplicated customer, so is only run on small inputs
+LEGACY_MAX = 20_000
+
+
+def legacy_drop_mail_dupes(mail_list, email_cols, phone_cols, prim_title):
+    """previous Export.drop_mail_dupes merging, kept as the benchmark baseline"""
+    mail_list.drop_duplicates(inplace=True)
+    dupes = mail_list[mail_list.duplicated(subset='cust_index')]
+    indices = set(dupes['cust_index'].values)
+
+    def condense(i, cols, kind='phone'):
+        values = set([x for x in mail_list[mail_list['cust_index'] == i][cols].values.flatten() if len(x) > 0])
+        if kind == 'phone':
+            clean_numbers = {re.sub(r"[^0-9]+", '', num): num for num in values
+                             if len(re.sub(r"[^0-9]+", '', num)) > 0}
+            return list(clean_numbers.values())
+        else:
+            return [email.strip() for email in values if len(email.strip()) > 1]
+
+    def unique_titles(i):
+        titles = ' '.join(mail_list[mail_list['cust_index'] == i][prim_title].values.flatten())
+        titles = [i.strip() for i in titles.split('.')]
+        unique = set(title.lower() for title in titles if len(title) > 1)
+        reduced = []
+        for title in titles:
+            if title.lower() in unique:
+                reduced.append(title + '.')
+                unique.remove(title.lower())
+        return ' '.join(reduced)
+
+    emails = {idx: condense(idx, email_cols, 'email') for idx in indices}
+    phones = {idx: condense(idx, phone_cols, 'phone') for idx in indices}
+    titles = {idx: unique_titles(idx) for idx in indices}
+
+    new_cols = [f'Email {i + 1}' for i in range(max(len(v) for i, v in enumerate(emails.values())))]
+    emails_df = pd.DataFrame.from_dict(emails, orient='index', columns=new_cols)
+    new_cols = [f'Phone Number {i + 1}' for i in range(max(len(v) for i, v in enumerate(phones.values())))]
+    phones_df = pd.DataFrame.from_dict(phones, orient='index', columns=new_cols)
+    titles_df = pd.DataFrame.from_dict(titles, orient='index', columns=[prim_title])
+    all_df = pd.concat([emails_df, phones_df, titles_df], axis=1)
+
+    dupes = dupes[set(dupes.columns) - {*email_cols, *phone_cols, prim_title}].set_index('cust_index')
+    dupes = dupes.join(all_df).reset_index().rename(columns={'index': 'cust_index'})
+    dupes.drop_duplicates(subset='cust_index', inplace=True)
+    mail_list.rename(columns={col: f'Email {i + 1}' for i, col in enumerate(email_cols)}, inplace=True)
+    mail_list.rename(columns={col: f'Phone Number {i + 1}' for i, col in enumerate(phone_cols)}, inplace=True)
+    mail_list.drop_duplicates(subset='cust_index', keep=False, inplace=True)
+    return pd.concat([mail_list, dupes], axis=0, ignore_index=True)
+
+
+def generate(n_rows, seed=0):
+    """build a mailing list where a fifth of customers matched two or three primary entries"""
+    rng = np.random.default_rng(seed)
+    n_cust = int(n_rows / 1.25)
+    cust = np.concatenate([np.arange(n_cust), rng.integers(0, n_cust, n_rows - n_cust)])
+
+    def phones(empty):
+        numbers = np.char.add('0', rng.integers(10 ** 7, 10 ** 8, n_rows).astype(str)).astype(object)
+        numbers[rng.random(n_rows) < empty] = ''
+        return numbers
+
+    df = pd.DataFrame({'cust_index': cust, 'TID': rng.integers(0, n_rows, n_rows),
+                       EMAILS[0]: np.char.add(cust.astype(str), '@example.de').astype(object),
+                       EMAILS[1]: rng.choice(['', 'info@example.de', 'praxis@example.de'], n_rows).astype(object),
+                       **{col: phones(0.3) for col in PHONES},
+                       TITLE: rng.choice(TITLES, n_rows).astype(object)})
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def summary(df):
+    """merged rows as sets of values, as the previous implementation's value order depends on set ordering"""
+    emails = df.filter(like='Email').apply(lambda row: frozenset(row.dropna()), axis=1)
+    phones = df.filter(like='Phone Number').apply(lambda row: frozenset(row.dropna()), axis=1)
+    return set(zip(df['cust_index'], df['TID'], emails, phones, df[TITLE]))
+
+
+def main(max_rows=500_000):
+    export = Export.__new__(Export)
+    export.prim_title = TITLE
+    export.phones = PhoneNormaliser()
+
+    sizes = [n for n in (10_000, 20_000, 100_000, 500_000) if n <= max_rows]
+    print(f"{'rows':>10} {'legacy (s)':>11} {'grouped (s)':>12} {'merged':>8} {'same':>5}")
+    for n_rows in sizes:
+        df = generate(n_rows)
+        legacy, same = '', ''
+        if n_rows <= LEGACY_MAX:
+            time = perf_counter()
+            old = legacy_drop_mail_dupes(df.copy(), EMAILS, PHONES, TITLE)
+            legacy = f'{perf_counter() - time:.3f}'
+
+        time = perf_counter()
+        new = export.drop_mail_dupes(df.copy(), EMAILS, PHONES)
+        grouped = perf_counter() - time
+
+        if n_rows <= LEGACY_MAX:
+            same = summary(old) == summary(new)
+        print(f'{n_rows:>10} {legacy:>11} {grouped:>12.3f} {n_rows - len(new):>8} {str(same):>5}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
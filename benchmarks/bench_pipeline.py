@@ -0,0 +1,142 @@
+"""Benchmark each stage of the match pipeline on synthetic databases of increasing size
+
+Times loading, cleaning, dropping duplicates, matching by name, contact data and areas, mailing lists, and reading
+Excel files, from the stages recorded by the program's metrics. Results are saved to benchmarks/results to compare
+against a previous run, e.g. of another commit.
+
+Usage: python benchmarks/bench_pipeline.py [max_rows] [baseline.json]
+"""
+import io
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime as dt
+from os.path import abspath, dirname, join
+from time import perf_counter
+
+import pandas as pd
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+from dbmerger.settings import Settings  # noqa: E402
+from dbmerger.match import Match  # noqa: E402
+from synthetic import AREAS, CUSTOMER, EXCEL_MAX, PRIMARY, generate, write_csv, write_xlsx  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+OPTIONS = ['n', 'p', 'e', 'f', 'd', 'l', 's', 'q']
+# writing excel files is slow, so only customer databases up to this size are also read from excel
+XLSX_MAX = 100_000
+RESULTS = join(ROOT, 'benchmarks', 'results')
+
+
+def get_settings(folder):
+    """default settings from settings.bak, with the synthetic areas and all folders in a temporary folder"""
+    shutil.copyfile(join(ROOT, 'settings.bak'), join(folder, 'settings.txt'))
+    with open(join(folder, 'areas.txt'), 'w', encoding='utf-8') as file:
+        file.writelines(f'{area}: {", ".join(alts)}\n' for area, alts in AREAS.items())
+
+    settings = Settings.__new__(Settings)
+    settings.filepath, settings.folder = join(folder, 'settings.txt'), folder
+    settings = settings.load_settings()
+
+    settings.update(options=OPTIONS, open='')
+    return settings
+
+
+def get_stages(span, path=''):
+    """timings of each stage within a span, named by their path, e.g. 'get_df/clean/dedup'"""
+    for child in span.children:
+        name = f'{path}/{child.name}' if path else child.name
+        yield name, {'wall': round(child.wall, 5), 'cpu': round(child.cpu, 5),
+                     'peak_mb': None if child.peak is None else round(child.peak, 1),
+                     'rows': child.fields.get('rows')}
+        yield from get_stages(child, name)
+
+
+def run(n_rows, xlsx_max=XLSX_MAX):
+    """generate databases and time each stage of matching them
+
+    :return: dict of stage names to their timings"""
+    with tempfile.TemporaryDirectory() as folder:
+        time = perf_counter()
+        primary, customer = generate(n_rows)
+        settings = get_settings(folder)
+        os.makedirs(settings['input'])
+        write_csv(join(settings['input'], f'{PRIMARY}.csv'), primary)
+        write_csv(join(settings['input'], f'{CUSTOMER}.csv'), customer)
+        xlsx = len(customer) <= min(xlsx_max, EXCEL_MAX)
+        if xlsx:
+            write_xlsx(join(settings['input'], f'{CUSTOMER}.xlsx'), customer)
+        generated = perf_counter() - time
+        del primary, customer
+
+        match = Match(settings)
+        with redirect_stdout(io.StringIO()), match.metrics.span('run') as stages:
+            with match.metrics.span('primary'):
+                index = match.get_primary(f'{PRIMARY}.csv')
+            with match.metrics.span('get_df'):
+                cust_main, cust_copy = match.get_df(f'{CUSTOMER}.csv', kind='cust')
+            with match.metrics.span('get_matches'):
+                same, diff, none = match.get_matches(index.copy, cust_copy, index.main, cust_main)
+            with match.metrics.span('mail'):
+                match.mail(same, index.main, cust_main)
+            if xlsx:
+                with match.metrics.span('xlsx2csv') as span:
+                    span.set(rows=len(match.read_excel(join(settings['input'], f'{CUSTOMER}.xlsx'))))
+
+        print(f'{n_rows} rows: generated in {generated:.1f}s, matched {len(same)} same, {len(diff)} diff, '
+              f'{len(none)} none')
+        return dict(get_stages(stages))
+
+
+def get_commit():
+    """short hash of the current commit, or None outside a git repository"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(results, baseline=None):
+    """print the wall time of each stage, with the change from the baseline if given"""
+    header = f"\n{'rows':>10} {'stage':<32} {'stage rows':>10} {'wall (s)':>9} {'cpu (s)':>8} {'peak MB':>8}"
+    print(header + (f" {'base (s)':>9} {'change':>7}" if baseline else ''))
+    for n_rows, stages in results.items():
+        base = (baseline or {}).get(n_rows, {})
+        for name, stage in stages.items():
+            line = (f"{n_rows:>10} {name:<32} {str(stage['rows'] or ''):>10} {stage['wall']:>9.3f} "
+                    f"{stage['cpu']:>8.3f} {str(stage['peak_mb'] or ''):>8}")
+            if name in base:
+                line += f" {base[name]['wall']:>9.3f} {stage['wall'] / max(base[name]['wall'], 1e-6):>6.2f}x"
+            print(line)
+
+
+def main(max_rows=1_000_000, baseline=None):
+    commit = get_commit()
+    results = {str(n_rows): run(n_rows) for n_rows in SIZES if n_rows <= max_rows}
+
+    if baseline is not None:
+        with open(baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        print(f"\nCompared to {baseline['commit']} ({baseline['created']})")
+    report(results, None if baseline is None else baseline['results'])
+
+    os.makedirs(RESULTS, exist_ok=True)
+    created = dt.now().isoformat(timespec='seconds')
+    filepath = join(RESULTS, f"pipeline_{created.replace(':', '-')}_{commit or 'unknown'}.json")
+    with open(filepath, 'w', encoding='utf-8') as file:
+        json.dump({'commit': commit, 'created': created, 'python': sys.version.split()[0], 'pandas': pd.__version__,
+                   'results': results}, file, indent=2)
+    print(f'\nResults saved to {filepath}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) if arg.isdigit() else arg for arg in sys.argv[1:]])
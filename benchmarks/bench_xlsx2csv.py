@@ -0,0 +1,188 @@
+"""Benchmark converting an Excel workbook to csv with per-style formatters against the previous per-cell format lookup
+
+Usage: python benchmarks/bench_xlsx2csv.py [n_cells]
+"""
+import datetime
+import logging
+import re
+import sys
+import tempfile
+from os.path import abspath, dirname, join
+from time import perf_counter
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+
+sys.path.insert(0, dirname(dirname(abspath(__file__))))
+import dbmerger.xlsx2csv as xlsx2csv  # noqa: E402
+from dbmerger.xlsx2csv import FORMATS, STANDARD_FORMATS, Sheet, eprint  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+N_COLS = 10
+# number formats of the generated columns, None for text
+COLUMNS = [None, 'General', '0', '0.00', '0%', 'dd.mm.yyyy', 'h:mm', '#,##0.000', '0.00E+00', None]
+
+
+class LegacySheet(Sheet):
+    """sheet formatting cells as before, resolving the style of every numeric cell, kept as the benchmark baseline"""
+
+    def handleCharData(self, data):
+        if self.in_cell_value:
+            format_type = None
+            format_str = "general"
+            self.collected_string += data
+            self.data = self.collected_string
+            if self.colType == "s":  # shared string
+                format_type = "string"
+                self.data = self.sharedStrings[int(self.data)]
+            elif self.colType == "b":  # boolean
+                format_type = "boolean"
+                self.data = (int(data) == 1 and "TRUE") or (int(data) == 0 and "FALSE") or data
+            elif self.colType == "str" or self.colType == "inlineStr":
+                format_type = "string"
+                self.data = data
+            elif self.s_attr:
+                s = int(self.s_attr)
+
+                # get cell format
+                xfs_numfmt = None
+                if s < len(self.styles.cellXfs):
+                    xfs_numfmt = self.styles.cellXfs[s]
+                if xfs_numfmt in self.styles.numFmts:
+                    format_str = self.styles.numFmts[xfs_numfmt]
+                elif xfs_numfmt in STANDARD_FORMATS:
+                    format_str = STANDARD_FORMATS[xfs_numfmt]
+
+                # get format type
+                if not format_str:
+                    eprint("unknown format %s at %d" % (format_str, xfs_numfmt))
+                    return
+
+                if format_str in FORMATS:
+                    format_type = FORMATS[format_str]
+                elif re.match("^\d+(\.\d+)?$", self.data) and re.match(".*[hsmdyY]", format_str) and not re.match(
+                        '.*\[.*[dmhys].*\]', format_str):
+                    # it must be date format
+                    if float(self.data) < 1:
+                        format_type = "time"
+                    else:
+                        format_type = "date"
+                elif re.match("^-?\d+(.\d+)?$", self.data) or (
+                        self.scifloat and re.match("^-?\d+(.\d+)?([eE]-?\d+)?$", self.data)):
+                    format_type = "float"
+                if format_type == 'date' and self.dateformat == 'float':
+                    format_type = "float"
+            elif self.colType == "n":
+                format_type = "float"
+
+            if format_type and not format_type in self.ignore_formats:
+                try:
+                    if format_type == 'date':  # date/time
+                        if self.workbook.date1904:
+                            date = datetime.datetime(1904, 1, 1) + datetime.timedelta(float(self.data))
+                        else:
+                            date = datetime.datetime(1899, 12, 30) + datetime.timedelta(float(self.data))
+                        if self.dateformat:
+                            # str(dateformat) - python2.5 bug, see: http://bugs.python.org/issue2782
+                            self.data = date.strftime(str(self.dateformat))
+                        else:
+                            # ignore ";@", don't know what does it mean right now
+                            # ignore "[$-409], [$-f409], [$-16001]" and similar format codes
+                            dateformat = re.sub(r"\[\$\-[A-z0-9]*\]", "", format_str, 1) \
+                                .replace(";@", "").replace("yyyy", "%Y").replace("yy", "%y") \
+                                .replace("hh:mm", "%H:%M").replace("h", "%I").replace("%H%H", "%H") \
+                                .replace("ss", "%S").replace("dddd", "d").replace("dd", "d").replace("d", "%d") \
+                                .replace("am/pm", "%p").replace("mmmm", "%B").replace("mmm", "%b") \
+                                .replace(":mm", ":%M").replace("m", "%m").replace("%m%m", "%m")
+                            self.data = date.strftime(str(dateformat)).strip()
+                    elif format_type == 'time':  # time
+                        t = int(round((float(self.data) % 1) * 24 * 60 * 60, 6))  # it should be in seconds
+                        d = datetime.time(int((t // 3600) % 24), int((t // 60) % 60), int(t % 60))
+                        self.data = d.strftime(self.timeformat)
+                    elif format_type == 'float' and ('E' in self.data or 'e' in self.data):
+                        self.data = str(self.floatformat or '%f') % float(self.data)
+                    # if cell is general, be aggressive about stripping any trailing 0s, decimal points, etc.
+                    elif format_type == 'float' and format_str == 'general':
+                        self.data = ("%f" % (float(self.data))).rstrip('0').rstrip('.')
+                    elif format_type == 'float' and format_str[0:3] == '0.0':
+                        if self.floatformat:
+                            self.data = str(self.floatformat) % float(self.data)
+                        else:
+                            L = len(format_str.split(".")[1])
+                            if '%' in format_str:
+                                L += 1
+                            self.data = ("%." + str(L) + "f") % float(self.data)
+                    elif format_type == 'float':
+                        # unsupported float formatting
+                        self.data = ("%f" % (float(self.data))).rstrip('0').rstrip('.')
+
+                except (ValueError, OverflowError):  # this catch must be removed, it's hiding potential problems
+                    eprint("Error: potential invalid date format.")
+                    # invalid date format
+                    pass
+
+
+def generate(filepath, n_cells, seed=0):
+    """write a workbook of text, number, percentage, date, and time columns with their number formats"""
+    rng = np.random.default_rng(seed)
+    n_rows = n_cells // N_COLS
+    numbers = rng.random((n_rows, N_COLS)) * 10.0 ** rng.integers(-2, 7, size=(n_rows, N_COLS))
+    start = datetime.datetime(1950, 1, 1)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append([f'column_{i}' for i in range(N_COLS)])
+    for row in range(n_rows):
+        cells = []
+        for col, number_format in enumerate(COLUMNS):
+            if number_format is None:
+                value = f'text {row % 1000} {col}'
+            elif number_format == 'dd.mm.yyyy':
+                value = start + datetime.timedelta(days=int(numbers[row, col] * 100) % 30000)
+            elif number_format == 'h:mm':
+                value = datetime.time(row % 24, row % 60)
+            else:
+                value = numbers[row, col]
+            cell = WriteOnlyCell(sheet, value)
+            if number_format is not None:
+                cell.number_format = number_format
+            cells.append(cell)
+        sheet.append(cells)
+    workbook.save(filepath)
+
+
+def convert(filepath, outpath, sheet):
+    """convert the first sheet with the given sheet class"""
+    xlsx2csv.Sheet = sheet
+    try:
+        time = perf_counter()
+        xlsx2csv.Xlsx2csv(filepath, delimiter=';').convert(outpath)
+        return perf_counter() - time
+    finally:
+        xlsx2csv.Sheet = Sheet
+
+
+def main(n_cells=1_000_000):
+    print(f'Excel conversion: {n_cells} cells')
+    with tempfile.TemporaryDirectory() as folder:
+        filepath = join(folder, 'bench.xlsx')
+        time = perf_counter()
+        generate(filepath, n_cells)
+        print(f'Generated workbook: {perf_counter() - time:.1f}s')
+
+        legacy = convert(filepath, join(folder, 'legacy.csv'), LegacySheet)
+        styled = convert(filepath, join(folder, 'styled.csv'), Sheet)
+
+        with open(join(folder, 'legacy.csv')) as a, open(join(folder, 'styled.csv')) as b:
+            same = a.read() == b.read()
+
+    print(f"{'converter':>12} {'time (s)':>9} {'cells/s':>10}")
+    print(f"{'legacy':>12} {legacy:>9.3f} {n_cells / legacy:>10.0f}")
+    print(f"{'per-style':>12} {styled:>9.3f} {n_cells / styled:>10.0f}")
+    print(f'Speedup: {legacy / styled:.2f}x  -  Same output: {same}')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,254 @@
+"""Generate realistic synthetic primary and customer databases for benchmarking
+
+Column names are read from the default settings (settings.bak). Customer databases contain a set share of people from the
+primary database, with the same, different, or missing contact data, and a set share of duplicate entries.
+
+Usage: python benchmarks/synthetic.py folder [n_rows] [xlsx]
+"""
+import os
+import sys
+from os.path import abspath, dirname, join
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+from dbmerger.settings import Settings  # noqa: E402
+from dbmerger.writer import get_rows  # noqa: E402
+
+PRIMARY = 'primary_database'
+CUSTOMER = 'customer_database'
+
+FIRST_NAMES = ['Anna', 'Andreas', 'Barbara', 'Bernd', 'Christian', 'Christina', 'Daniel', 'Doris', 'Elke', 'Erik',
+               'Felix', 'Franziska', 'Frank', 'Gabriele', 'Georg', 'Hannah', 'Hans', 'Heike', 'Ingrid', 'Jan', 'Jörg',
+               'Julia', 'Jürgen', 'Karin', 'Katrin', 'Klaus', 'Lena', 'Lukas', 'Manfred', 'Maria', 'Markus', 'Martina',
+               'Matthias', 'Michael', 'Monika', 'Nicole', 'Niklas', 'Petra', 'Peter', 'Ralf', 'Renate', 'Sabine',
+               'Sandra', 'Sebastian', 'Silke', 'Stefan', 'Susanne', 'Thomas', 'Tobias', 'Ursula', 'Uwe', 'Werner',
+               'Wolfgang', 'Yvonne', 'Zoe', 'Sören', 'Björn', 'Günther', 'Käthe', 'Dörte']
+LAST_NAMES = ['Müller', 'Schmidt', 'Schneider', 'Fischer', 'Weber', 'Meyer', 'Wagner', 'Becker', 'Schulz', 'Hoffmann',
+              'Schäfer', 'Koch', 'Bauer', 'Richter', 'Klein', 'Wolf', 'Schröder', 'Neumann', 'Schwarz', 'Zimmermann',
+              'Braun', 'Krüger', 'Hofmann', 'Hartmann', 'Lange', 'Schmitt', 'Werner', 'Schmitz', 'Krause', 'Meier']
+# rarer surnames are built from parts, and double-barrelled from those at millions of rows, so the number of people
+# sharing a name stays realistic as databases grow
+SURNAME_PARTS = (['Hof', 'Berg', 'Stein', 'Wald', 'Ross', 'Kirch', 'Lind', 'Brand', 'Eich', 'Feld', 'Gross', 'Schön',
+                  'Rosen', 'Stern', 'Sonnen', 'Winter', 'Sommer', 'Hart', 'Neu', 'Alt', 'Hoch', 'Weiss', 'Roth',
+                  'Grün', 'Blum', 'Kron', 'Lauten', 'Buch', 'Ham', 'Kessel'],
+                 ['', 'en', 'el', 'ig', 'ers', 'an', 'ing', 'es', 'ol', 'ur', 'a', 'i', 'ert', 'und', 'ach'],
+                 ['mann', 'er', 'feld', 'bauer', 'meier', 'berger', 'hausen', 'schmidt', 'thal', 'hofer', 'inger',
+                  'brink', 'bach', 'mayr', 'huber', 'stätter', 'ecker', 'müller', 'wieser', 'lechner'])
+COMMON_SHARE = 0.1
+PEOPLE_PER_NAME = 2
+MAX_PER_COMMON_NAME = 50
+
+TITLES = ['', 'Dr.', 'Dr. med.', 'Prof. Dr.', 'Dipl.-Med.', 'Dr. med. dent.', 'dr.']
+TITLE_WEIGHTS = [0.35, 0.25, 0.2, 0.08, 0.05, 0.05, 0.02]
+DOMAINS = ['praxis-am-markt.de', 'gmx.de', 'web.de', 't-online.de', 'klinikum-nord.de', 'mvz-mitte.de', 'aerzte.de']
+AREAS = {'Allgemeinmedizin': ['Hausarzt', 'general'], 'Innere Medizin': ['Internist', 'internal'],
+         'Kardiologie': ['cardiology'], 'Neurologie': ['neurology'], 'Dermatologie': ['Hautarzt'],
+         'Chirurgie': ['Chirurg', 'surgery'], 'Orthopädie': ['orthopaedics'], 'Pädiatrie': ['Kinderarzt'],
+         'Gynäkologie': ['Frauenarzt'], 'Urologie': ['urology'], 'Radiologie': ['radiology'],
+         'Psychiatrie': ['psychiatry'], 'Onkologie': ['oncology'], 'Augenheilkunde': ['Augenarzt']}
+CITIES = ['Berlin', 'Potsdam', 'Hamburg', 'München', 'Köln', 'Leipzig', 'Dresden', 'Frankfurt', 'Bremen', 'Cottbus']
+# rows above the header, as found in exports from other programs
+JUNK_ROWS = [['Datenexport Adressen'], ['Stand: 01.01.2021', 'Seite 1'], []]
+# excel sheets hold at most this many rows
+EXCEL_MAX = 1_048_576 - len(JUNK_ROWS) - 1
+
+
+def get_surnames(rng, n):
+    """surnames built from every combination of parts, and double-barrelled surnames if needed for n people"""
+    starts, middles, ends = SURNAME_PARTS
+    built = np.array([start + middle + end for start in starts for middle in middles for end in ends], dtype=object)
+    extra = n // (PEOPLE_PER_NAME * len(FIRST_NAMES)) - len(built)
+    if extra <= 0:
+        return built
+
+    barrelled = rng.choice(built, extra) + '-' + rng.choice(built, extra)
+    return np.concatenate([built, barrelled])
+
+
+def get_names(rng, n, population=None):
+    """first and last names, with a share of common surnames, at most a set number of people per common name
+
+    :param population: number of people the names are drawn from, n if None"""
+    population = n if population is None else population
+    common, rare = np.array(LAST_NAMES, dtype=object), get_surnames(rng, population)
+    share = min(COMMON_SHARE, MAX_PER_COMMON_NAME * len(LAST_NAMES) * len(FIRST_NAMES) / max(population, 1))
+    last = np.where(rng.random(n) < share, rng.choice(common, n), rng.choice(rare, n))
+    return rng.choice(np.array(FIRST_NAMES, dtype=object), n), last
+
+
+def get_phones(rng, n, prefixes, empty=0.0):
+    """phone numbers in mixed formats, starting with an area code to drop, a mobile prefix, or another area code"""
+    prefix = rng.choice(np.array([*prefixes, '01', '040', '089', '0221'], dtype=object), n)
+    number = pd.Series(rng.integers(10 ** 6, 10 ** 8, n)).astype(str).to_numpy(dtype=object)
+    separator = rng.choice(np.array([' ', '-', '/', '', ' / '], dtype=object), n)
+    phones = pd.Series(prefix + separator + number, dtype=object)
+    phones[rng.random(n) < empty] = np.nan
+    return phones
+
+
+def to_ascii(names):
+    """names as used in email addresses"""
+    return (names.str.lower().str.replace('ä', 'ae').str.replace('ö', 'oe').str.replace('ü', 'ue')
+            .str.replace('ß', 'ss').str.replace(r'[^a-z]', '', regex=True))
+
+
+def get_emails(rng, first, last, roles, empty=0.0):
+    """personal or role addresses, e.g. 'sekretariat@', on a mix of practice and mail provider domains"""
+    n = len(first)
+    domain = rng.choice(np.array(DOMAINS, dtype=object), n)
+    personal = to_ascii(pd.Series(first)) + '.' + to_ascii(pd.Series(last)) + '@' + domain
+    role = pd.Series(rng.choice(np.array(roles, dtype=object), n) + domain)
+    emails = personal.where(rng.random(n) < 0.6, role)
+    emails[rng.random(n) < empty] = np.nan
+    return emails
+
+
+def get_areas(rng, n, names):
+    """free text naming medical areas by name or alternative name, e.g. 'Innere Medizin, Hausarzt'"""
+    words = np.array([*names, *[alt for alts in AREAS.values() for alt in alts], 'Praxis', 'Klinik'], dtype=object)
+    count = rng.choice([0, 1, 1, 2], n)
+    first, second = pd.Series(rng.choice(words, n)), pd.Series(rng.choice(words, n))
+    return first.where(count > 0, '').where(count < 2, first + ', ' + second)
+
+
+def get_primary(rng, n, settings):
+    """primary database with contact data, greetings, titles, and one-hot medical areas"""
+    first, last = get_names(rng, n)
+    female = rng.random(n) < 0.5
+    # a few greetings carry the typo fixed for mailing lists
+    greeting = np.where(female, np.where(rng.random(n) < 0.05, 'Sehr geeherte Frau', 'Sehr geehrte Frau'),
+                        'Sehr geehrter Herr')
+
+    df = pd.DataFrame({settings['id']: rng.permutation(n) + 100_000, 'Anrede': np.where(female, 'Frau', 'Herr'),
+                       settings['title']: rng.choice(TITLES, n, p=TITLE_WEIGHTS), settings['names'][0]: first,
+                       settings['names'][1]: last, settings['greeting']: greeting,
+                       settings['interest']: rng.choice([0, 1, 2], n, p=[0.6, 0.3, 0.1])})
+    for i, col in enumerate(settings['phones']):
+        df[col] = get_phones(rng, n, settings['phone_drop'], empty=0.3 + 0.15 * i)
+    for i, col in enumerate(settings['emails']):
+        df[col] = get_emails(rng, first, last, settings['email_sort'], empty=0.4 + 0.2 * i)
+    for i, col in enumerate(settings['faxes']):
+        df[col] = get_phones(rng, n, settings['phone_drop'], empty=0.6 + 0.2 * i)
+
+    df['PLZ'] = pd.Series(rng.integers(1000, 99999, n)).astype(str).str.zfill(5)
+    df['Ort'] = rng.choice(CITIES, n)
+    for area in AREAS:
+        df[area] = (rng.random(n) < 0.12).astype(np.int64)
+    return df
+
+
+def get_customer(rng, primary, n, settings, match_rate=0.4, dupe_rate=0.05):
+    """customer database where a share of rows are people from the primary database
+
+    :param match_rate: share of rows copying a primary person, of which half have the same contact data, a third
+                       different contact data, and the rest none
+    :param dupe_rate: share of rows repeated later in the database, some with fewer contact values"""
+    n_unique = int(n / (1 + dupe_rate))
+    matched = rng.random(n_unique) < match_rate
+    source = primary.iloc[rng.integers(0, len(primary), matched.sum())].reset_index(drop=True)
+
+    first, last = get_names(rng, n_unique, len(primary))
+    first[matched], last[matched] = source[settings['names'][0]].to_numpy(), source[settings['names'][1]].to_numpy()
+    phone = get_phones(rng, n_unique, settings['phone_drop'], empty=0.25)
+    email = get_emails(rng, first, last, settings['email_sort'], empty=0.4)
+    fax = get_phones(rng, n_unique, settings['phone_drop'], empty=0.7)
+
+    # matched rows keep the primary's contact data, some numbers without the area code to drop
+    kind = rng.choice(['same', 'diff', 'none'], matched.sum(), p=[0.5, 0.3, 0.2])
+    prim_phone = source[settings['phones'][0]].fillna(source[settings['phones'][-1]])
+    drop = '^(' + '|'.join(settings['phone_drop']) + r')[^0-9]*'
+    prim_phone = prim_phone.where(rng.random(len(source)) < 0.7, prim_phone.str.replace(drop, '', regex=True))
+    rows = np.flatnonzero(matched)
+    same = kind == 'same'
+    phone[rows[same]] = prim_phone[same].to_numpy()
+    email[rows[same]] = source[settings['emails'][0]][same].to_numpy()
+    for col in (phone, email, fax):
+        col[rows[kind == 'none']] = np.nan
+
+    contacts = [settings['cust_phone'], settings['cust_email'], settings['cust_fax']]
+    df = pd.DataFrame({settings['cust_names'][0]: first, settings['cust_names'][1]: last,
+                       settings['cust_title']: rng.choice(TITLES, n_unique, p=TITLE_WEIGHTS),
+                       **dict(zip(contacts, [phone, email, fax])),
+                       **{col: get_areas(rng, n_unique, list(AREAS)) for col in settings['cust_areas'][:2]},
+                       'Kundennummer': rng.permutation(n_unique) + 1})
+
+    # duplicates of random rows placed at random positions, with some contact values dropped
+    dupes = df.iloc[rng.integers(0, n_unique, n - n_unique)].copy()
+    for col in contacts:
+        dupes.loc[rng.random(len(dupes)) < 0.3, col] = np.nan
+    df = pd.concat([df, dupes], ignore_index=True)
+    return df.iloc[rng.permutation(len(df))].reset_index(drop=True)
+
+
+def get_settings(filepath=join(ROOT, 'settings.bak')):
+    """column names and mailing list options from the default settings
+
+    Customer names use the primary name columns where the customer name settings include them, otherwise the first
+    customer name columns, and each other customer column the first name given in the settings."""
+    settings = Settings.__new__(Settings)
+    settings.filepath, settings.folder = filepath, dirname(filepath)
+    settings = settings.load_settings()
+    prim_cols, cust_cols = settings['prim_cols'], settings['cust_cols']
+
+    names = prim_cols['n'][:2]
+    cust_names = names if set(names).issubset(cust_cols['n']) else cust_cols['n'][:2]
+    return {'id': settings['id'], 'names': names, 'title': settings['title'], 'greeting': settings['greeting'],
+            'interest': settings['interest'], 'phones': prim_cols['p'], 'emails': prim_cols['e'],
+            'faxes': prim_cols['f'], 'cust_names': cust_names, 'cust_title': settings['cust_title'][0],
+            'cust_phone': cust_cols['p'][0], 'cust_email': cust_cols['e'][0], 'cust_fax': cust_cols['f'][0],
+            'cust_areas': settings['cust_areas'], 'phone_drop': settings['phone_drop'],
+            'email_sort': settings['email_sort']}
+
+
+def generate(n_primary, n_customer=None, match_rate=0.4, dupe_rate=0.05, seed=0):
+    """build a primary database and a customer database
+
+    :param n_customer: rows of the customer database, half the primary rows if None
+    :return: primary and customer dataframes"""
+    rng = np.random.default_rng(seed)
+    settings = get_settings()
+    primary = get_primary(rng, n_primary, settings)
+    n_customer = n_primary // 2 if n_customer is None else n_customer
+    return primary, get_customer(rng, primary, n_customer, settings, match_rate, dupe_rate)
+
+
+def write_csv(filepath, df):
+    """write a ';' delimited csv file with junk rows above the header"""
+    with open(filepath, 'w', encoding='utf-8', newline='') as file:
+        for row in JUNK_ROWS:
+            file.write(';'.join(row) + '\n')
+        df.to_csv(file, sep=';', index=False)
+
+
+def write_xlsx(filepath, df):
+    """write an excel file with junk rows above the header, in write-only mode"""
+    if len(df) > EXCEL_MAX:
+        raise ValueError(f'{len(df)} rows do not fit in an Excel sheet')
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title='Export')
+    for row in JUNK_ROWS:
+        ws.append(row)
+    ws.append([str(col) for col in df.columns])
+    for row in get_rows(df):
+        ws.append(row)
+    wb.save(filepath)
+
+
+def main(folder, n_rows=10_000, xlsx='no'):
+    """write a primary and a customer database to a folder as csv files, and as excel files if 'xlsx' given"""
+    os.makedirs(folder, exist_ok=True)
+    primary, customer = generate(n_rows)
+    write_csv(join(folder, f'{PRIMARY}.csv'), primary)
+    write_csv(join(folder, f'{CUSTOMER}.csv'), customer)
+    if xlsx == 'xlsx':
+        write_xlsx(join(folder, f'{CUSTOMER}.xlsx'), customer)
+    print(f'Wrote {len(primary)} primary and {len(customer)} customer rows to {folder}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1], *[int(arg) if arg.isdigit() else arg for arg in sys.argv[2:]])
@@ -0,0 +1,77 @@
+import logging
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+
+class AreaMatcher:
+    """Medical areas held as bitmasks, one bit per area, packed into bytes
+
+    Primary areas are read from their one-hot columns, customer areas by searching free text for each area's name and
+    its alternative names from areas.txt, so a pair matches if their bitmasks share any bit."""
+
+    def __init__(self, areas):
+        """:param areas: dict of area names to lists of their alternative names, in bit order"""
+        self.areas = list(areas)
+
+        # areas found by each pattern
+        found = {}
+        for i, (area, alts) in enumerate(areas.items()):
+            for pattern in [area, *alts]:
+                found.setdefault(pattern, np.zeros(len(self.areas), dtype=bool))[i] = True
+
+        # only the longest pattern starting at each position is matched, so each pattern also finds every pattern
+        # contained in it
+        self.masks = {pattern: np.packbits(np.any([found[other] for other in found if other in pattern], axis=0))
+                      for pattern in found}
+        self.empty = np.zeros_like(np.packbits(np.zeros(len(self.areas), dtype=bool)))
+
+        # compiled once and run over each text in one pass, trying longer patterns first at each position
+        patterns = sorted(found, key=len, reverse=True)
+        self.pattern = re.compile('(?=(' + '|'.join(re.escape(pattern) for pattern in patterns) + '))')
+        logger.debug(f'Area patterns: {len(patterns)}')
+
+    def encode(self, df):
+        """bitmasks of areas set in one-hot area columns
+
+        :param df: dataframe with a column for each area, non-zero where set
+        :return: 2D array of packed bits, one row per dataframe row"""
+        return np.packbits(df[self.areas].fillna(0).to_numpy() != 0, axis=1)
+
+    def search(self, df):
+        """bitmasks of areas found in any free text column, searching each unique text once
+
+        :return: 2D array of packed bits, one row per dataframe row"""
+        bits = np.zeros((len(df), len(self.empty)), dtype=np.uint8)
+        for col in df.columns:
+            codes, texts = pd.factorize(df[col].fillna('').astype(str))
+            found = np.array([self.find(text) for text in texts]).reshape(-1, len(self.empty))
+            bits |= found[codes]
+        return bits
+
+    def find(self, text):
+        """bitmask of areas found in a text"""
+        mask = self.empty
+        for pattern in {match.group(1) for match in self.pattern.finditer(text)}:
+            mask = mask | self.masks[pattern]
+        return mask
+
+    def names(self, bits):
+        """comma separated names of areas set in each bitmask"""
+        unique, inverse = np.unique(bits, axis=0, return_inverse=True)
+        areas = np.array(self.areas, dtype=object)
+        names = [', '.join(areas[row]) for row in np.unpackbits(unique, axis=1, count=len(self.areas)).astype(bool)]
+        return np.array(names, dtype=object)[inverse]
+
+    @staticmethod
+    def matches(prim_bits, cust_bits):
+        """check which pairs of bitmasks share any area"""
+        return (prim_bits & cust_bits).any(1)
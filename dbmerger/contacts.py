@@ -0,0 +1,56 @@
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# status codes for each matched pair, ordered so the best status for an ID is its maximum
+NONE, DIFF, SAME = 0, 1, 2
+
+
+def melt_pairs(matches, cols):
+    """melt contact columns of matched rows to long-format arrays of pair key and value, dropping empty values"""
+    values = matches[cols].to_numpy().ravel()
+    pairs = np.repeat(np.arange(len(matches)), len(cols))
+    present = pd.notna(values)
+    return pairs[present], values[present]
+
+
+def match_pairs(matches, prim_col, cust_col):
+    """hash join primary and customer contact values of one column type on (pair, value)
+
+    :return: boolean arrays over matched rows for values matched and for any value present"""
+    prim_pairs, prim_vals = melt_pairs(matches, prim_col)
+    cust_pairs, cust_vals = melt_pairs(matches, cust_col)
+
+    # encode each (pair, value) as one integer key so the join is a single hash lookup
+    codes, uniques = pd.factorize(np.concatenate([prim_vals, cust_vals]))
+    keys = np.concatenate([prim_pairs, cust_pairs]).astype(np.int64) * len(uniques) + codes
+    prim_keys, cust_keys = keys[:len(prim_pairs)], keys[len(prim_pairs):]
+    matched = cust_pairs[pd.Series(cust_keys).isin(prim_keys).to_numpy()]
+
+    same = np.zeros(len(matches), dtype=bool)
+    present = np.zeros(len(matches), dtype=bool)
+    same[matched] = True
+    present[prim_pairs] = True
+    present[cust_pairs] = True
+    return same, present
+
+
+def get_status(ids, same, present):
+    """decide perfect, uncertain, or missing data status for each ID from the results of its matched rows
+
+    :return: sets for perfect matches, uncertain matches, and missing info available"""
+    status = np.select([same, present], [SAME, DIFF], default=NONE)
+    status = pd.Series(status, index=np.asarray(ids)).groupby(level=0).max()
+
+    same_idx = set(status.index[status == SAME])
+    diff_idx = set(status.index[status == DIFF])
+    none_idx = set(status.index[status == NONE])
+    return same_idx, diff_idx, none_idx
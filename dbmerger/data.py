@@ -6,15 +6,21 @@ import re
 import shutil
 import sys
 from itertools import chain
-from multiprocessing import cpu_count
-from multiprocessing.dummy import Pool
-from os.path import basename, dirname, join
+from os.path import basename, dirname, exists, getsize, join, splitext
 from time import perf_counter
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
 
+import dbmerger.parallel as parallel
 import dbmerger.xlsx2csv as xlsx2csv
+from dbmerger.dedupe import subsumed
+from dbmerger.fuzzy import FuzzyIndex
+from dbmerger.index import PrimaryIndex
+from dbmerger.metrics import Metrics
+from dbmerger.phones import PhoneNormaliser
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -22,6 +28,23 @@ stdout_handler = logging.StreamHandler(stream=sys.stdout)
 stdout_handler.setLevel(logging.INFO)
 logger.addHandler(stdout_handler)
 
+# rough in-memory size of a parsed row, its cleaned copy, and its matches relative to its size on disk
+MEMORY_FACTOR = 10
+MIN_CHUNKSIZE = 1000
+
+
+def read_sheet(filepath, nrows=20, usecols=None, strings=(), outpath=None, rows=None):
+    """read the first sheet of an excel file into an arrow table, also run in worker processes
+
+    :return: arrow table of the sheet below its header row"""
+    try:
+        return xlsx2csv.Xlsx2csv(filepath, delimiter=';').read(nrows=nrows, usecols=usecols, strings=strings,
+                                                              outfile=outpath, rows=rows)
+    except Exception:
+        if outpath is not None and exists(outpath):  # don't leave a partial csv to be loaded next time
+            os.remove(outpath)
+        raise
+
 
 class Data:
 
@@ -35,41 +58,73 @@ class Data:
         self.prim_id = settings['id']
 
         self.cust_cols = settings['cust_cols']
+        self.prim_interest = settings['interest']
+
+        # columns loaded for matching and exports, other columns are only loaded for the rows exported in full
+        self.usecols = {
+            'primary': sorted({self.prim_id, *chain(*self.prim_cols.values()), self.prim_interest,
+                               settings['greeting'], settings['title'], *settings['areas'].keys(),
+                               *settings['email_add']}),
+            'cust': sorted({*chain(*self.cust_cols.values()), *settings['cust_title'], *settings['cust_areas'],
+                            *settings['email_add']})}
 
         # mailing list/phone options
         self.phone_drop = settings['phone_drop']
+        self.phones = PhoneNormaliser(settings['phone_drop'], settings['phone_sort'])
+
+        # customer databases larger than the memory budget in MB are streamed in chunks, 0 to always load fully
+        self.memory_budget = settings['memory_budget']
 
         # directories
         self.input_path = settings['input']
+        self.cache_path = settings['cache']
         self.prim_filename = settings['prim_filename'] + '.csv'
+        self.excel_csv = settings['excel_csv']
+
+        # excel files read ahead in worker processes, if started
+        self.reads = None
+
+        # timings of each stage, written to the log folder when run as a program
+        self.metrics = Metrics()
 
         # create directories as needed        
         if not os.path.exists(self.input_path):  # if input folder doesn't exist
             logging.debug(f'Creating input path at {self.input_path}')
             os.makedirs(self.input_path)  # create input folder
 
-        logger.debug(f'========== Data object instantiated ==========\n{json.dumps(self.__dict__, indent=2)}')
+        logger.debug(f'========== Data object instantiated ==========\n{json.dumps(self.__dict__, indent=2, default=vars)}')
 
     def check_files(self):
         """get filenames and check for primary database presence"""
-        # get input database filenames
-        cust_filenames = [basename(file) for file in glob.glob(f'{self.input_path}/*.csv')
-                          if not file.startswith('~$')]
+        # get input database filenames, excel files are only read if not already saved as csv
+        cust_filenames = [basename(file) for file in glob.glob(f'{self.input_path}/*.csv')]
+        cust_filenames += [basename(file) for file in glob.glob(f'{self.input_path}/*.xlsx')
+                           if not basename(file).startswith('~$') and splitext(file)[0] + '.csv' not in
+                           glob.glob(f'{self.input_path}/*.csv')]
         logger.debug(f'Files in input folder:\n{cust_filenames}')
 
-        # no csv files in folder
+        # no csv or excel files in folder
         if len(cust_filenames) == 0:
-            logger.critical("Input folder doesn't contain any csv files!")
+            logger.critical("Input folder doesn't contain any csv or Excel files!")
             print("Add your files to the following path and restart the program:")
             print(self.input_path, '\n')
             return None, None
 
-        # check for primary database presence
+        # check for primary database presence, as csv or excel file
+        prim_name = splitext(self.prim_filename)[0]
+        if self.prim_filename not in cust_filenames and self.get_filename(prim_name) in cust_filenames:
+            self.prim_filename = self.get_filename(prim_name)
+
+        if self.prim_filename not in cust_filenames and 'q' in self.options:  # no user input in auto mode
+            logger.critical(f"Primary Database not found! (Filename {self.prim_filename} not found in input folder)")
+            print(f"Add the primary database to {self.input_path} or change its name in the settings\n")
+            return None, None
+
         while self.prim_filename not in cust_filenames:
             logger.warning(f"Primary Database not found! (Filename {self.prim_filename} not found in input folder)")
             logger.debug('Getting user input')
             print()
-            logger.info('Input folder contains the following csv files: ')
+            logger.info('Input folder contains the following csv and Excel files: ')
             [logger.info(file) for file in cust_filenames]  # print list of csv files
             print(f"\nDon't see your file? Move it to {self.input_path} and restart the program!\n")
 
@@ -80,13 +135,11 @@ class Data:
             if name == '':  # use default if not given
                 name = 'prim_database'
 
-            if not name.endswith('csv'):  # append file type if not given
-                self.prim_filename = name + '.csv'
+            # append file type if not given
+            self.prim_filename = name if name.endswith(('.csv', '.xlsx')) else self.get_filename(name)
             logger.debug(f'output: {self.prim_filename}')
             print('\n', '-' * 28, '\n', sep='')
 
-        # check again for file conversion if needed
-        self.convert_excel()
         # drop primary database from customer database list
         cust_filenames.remove(self.prim_filename)
         logger.debug(f'Primary Filename: {self.prim_filename}')
@@ -96,61 +149,23 @@ class Data:
     @staticmethod
     def drop_dupes(df, cols):
         """attempts to drop duplicates based on matching info by data type keep rows containing most info"""
-
-        # function to check for dupes for numpy apply method
-        def check_dupes(data):
-            # boolean indexing for NaNs
-            # must compare NaN values to string 'nan' for string arrays
-            if not isinstance(data[0], str):
-                nans = np.isnan(arr)
-            else:
-                nans = (arr == np.array([np.nan]).astype(str)[0])
-
-            # boolean indexing for matches
-            matches = (arr == data)
-            rows = np.where((matches + nans).all(1) * ~nans.all(1))[0]
-
-            # if duplicates and not already logged
-            if len(rows) > 1 and all(row not in drop for row in rows):
-                # boolean indexing for NaNs
-                # must compare NaN values to string 'nan' for string arrays
-                def nunique(a):
-                    # return n-unique values in one row of array of integers or strings
-                    if not isinstance(a[0], str):
-                        return len(set(a[~np.isnan(a)]))
-                    else:
-                        return len(set(a[a != np.array([np.nan]).astype(str)[0]]))
-
-                # row with most info is kept 
-                count = np.apply_along_axis(nunique, 1, arr)
-                drop.extend([v for k, v in zip(count, rows) if k != max(count)])
-
-                return [False] * len(data)
-            return [True] * len(data)
-
-        # build duplicates to drop for each data type
-        drop = []
+        # rows flagged for any data type are dropped
+        drop = np.zeros(len(df), dtype=bool)
         text = {'p': 'phone numbers', 'e': 'emails', 'f': 'fax numbers'}
         for i, col in cols.items():
             if i not in text.keys() or len(col) == 0:
                 continue
 
             logger.info(f'Dropping duplicates for {text[i]}... ')
+            drop |= subsumed(df[col])
 
-            if i == 'e':
-                arr = df[col].to_numpy(dtype=str)
-                np.apply_along_axis(check_dupes, 1, arr)
-            elif i != 'n':
-                arr = df[col].to_numpy(dtype=float)
-                np.apply_along_axis(check_dupes, 1, arr)
+        logger.info(f'Deleted {drop.sum()} entries containing duplicate data')
+        return df[~drop]  # drop duplicates
 
-        drop = list(set(drop))  # get unique values
-        logger.info(f'Deleted {len(drop)} entries containing duplicate data')
-        # [print(drop[i:i + 15]) for i in range(0, len(drop), 15)]  # print row numbers
-        return df[~df.index.isin(drop)]  # drop duplicates
+    def clean_df(self, df, kind, dedupe=True):
+        """copy and clean dataframe
 
-    def clean_df(self, df, kind):
-        """copy and clean dataframe"""
+        :param dedupe: drop duplicates if enabled, otherwise left to the caller, e.g. across all chunks of a file"""
         if kind == 'primary':  # primary columns
             cols = {k: list(set(v).intersection(set(df.columns))) for k, v in self.prim_cols.copy().items()}
             nme = cols.get('n', [])
@@ -173,7 +188,7 @@ class Data:
 
         # drop customers who don't want to be contacted
         if 'i' in self.options and kind == 'primary':
-            df = df[df['Interesse MAFO'] != 2]
+            df = df[df[self.prim_interest] != 2]
             logger.debug('Dropping customers who do not want to be contacted')
 
         # copy dataframe keeping only relevant matching columns
@@ -188,26 +203,39 @@ class Data:
 
             # numeric columns
             logger.debug('Processing numeric columns')
-            df_copy.loc[:, [*num, *fax]] = df_copy[[*num, *fax]].replace(r'[^0-9]+', '', regex=True)
-            rgx_drop = '|'.join([f'^{pre}' for pre in self.phone_drop])
-            df_copy.loc[:, num] = df_copy[num].replace(rgx_drop, '', regex=True)
-
-            df_copy.loc[:, [*num, *fax]] = df_copy[[*num, *fax]].apply(pd.to_numeric, errors='coerce')
+            for col in [*num, *fax]:  # exact unsigned integers, floats lose digits of long numbers
+                digits, truncated, _ = self.phones.normalise(df_copy[col])
+                df_copy[col] = self.to_uint(truncated if col in num else digits)
 
         # attempt to drop duplicates
-        if 'd' in self.options and (kind != 'primary' or 'z' in self.options):
-            df_copy = self.drop_dupes(df_copy, cols)
+        if dedupe and 'd' in self.options and (kind != 'primary' or 'z' in self.options):
+            with self.metrics.span('dedup') as span:
+                df_copy = self.drop_dupes(df_copy, cols)
+                span.set(rows=len(df_copy))
+
+        # store cleaned names and emails as arrow strings rather than python objects
+        size = df_copy.memory_usage(deep=True).sum()
+        df_copy = df_copy.astype({col: 'string[pyarrow]' for col in [*nme, *eml]})
+        logger.debug(f'Copy memory: {size / 2 ** 20:.2f}MB as objects, '
+                     f'{df_copy.memory_usage(deep=True).sum() / 2 ** 20:.2f}MB as compact types')
 
         return df_copy
 
-    def get_df(self, filename, kind='primary', sep=';', nrows=20):
-        """load and process dataframe from input folder"""
-        text = 'primary' if kind == 'primary' else 'customer'
+    @staticmethod
+    def to_uint(col):
+        """convert strings of digits to nullable unsigned integers, empty values and numbers too long to store as NA"""
+        col = col.where(col.notna() & col.astype(str).str.len().between(1, 19))
+        mask = col.isna().to_numpy()
+        values = np.zeros(len(col), dtype=np.uint64)
+        values[~mask] = col[~mask].to_numpy().astype(np.uint64)
+        return pd.Series(pd.arrays.IntegerArray(values, mask), index=col.index)
 
-        # get number of header rows to skip
+    @staticmethod
+    def get_skip(filepath, sep=';', nrows=20):
+        """get number of header rows to skip, taking the row with the most filled fields in the first rows as header"""
         skip = -1
         max_length = -1
-        with open(f'{self.input_path}/{filename}', 'r') as file:
+        with open(filepath, 'r') as file:
             for i, line in enumerate(file):
                 if i > nrows:
                     break
@@ -216,61 +244,273 @@ class Data:
                     skip = i
                     max_length = length
 
+        return skip
+
+    def get_usecols(self, filepath, skip, kind, sep=';'):
+        """get columns of the detected header row used for matching and exports, in file order"""
+        header = pd.read_csv(filepath, sep=sep, skiprows=skip, nrows=0).columns
+        return [col for col in header if col in self.usecols[kind]]
+
+    def read_csv(self, filepath, skip, usecols=None, sep=';'):
+        """parse database with the multithreaded pyarrow reader, falling back to pandas for files it can't parse
+
+        Matching columns are read as strings so phone numbers keep leading zeros and all their digits."""
+        header = pd.read_csv(filepath, sep=sep, skiprows=skip, nrows=0).columns.tolist()
+        strings = set(chain(*self.prim_cols.values(), *self.cust_cols.values())).intersection(header)
+
+        try:  # column names from pandas, so duplicate and unnamed columns are named alike
+            table = csv.read_csv(filepath, read_options=csv.ReadOptions(skip_rows=skip + 1, column_names=header),
+                                 parse_options=csv.ParseOptions(delimiter=sep),
+                                 convert_options=csv.ConvertOptions(include_columns=usecols or header,
+                                                                    column_types={c: pa.string() for c in strings},
+                                                                    strings_can_be_null=True))
+        except (pa.ArrowInvalid, pa.ArrowKeyError) as e:
+            logger.debug(f'Parsing with pandas, could not parse with pyarrow: {e}')
+            return pd.read_csv(filepath, sep=sep, skiprows=skip, usecols=usecols, dtype={c: str for c in strings},
+                               low_memory=False)
+
+        # keep dates as written rather than converting them as pyarrow infers
+        for i, field in enumerate(table.schema):
+            if pa.types.is_temporal(field.type):
+                table = table.set_column(i, field.name, table.column(i).cast(pa.string()))
+
+        # arrow nulls convert to None in object columns, use NaN as pandas does
+        return table.to_pandas().fillna(np.nan)
+
+    @staticmethod
+    def is_excel(filename):
+        return filename.endswith('.xlsx')
+
+    def get_filename(self, name):
+        """get filename of a database in the input folder from its name without file type, preferring csv
+
+        :param name: name without file type, which may itself contain dots"""
+        if exists(join(self.input_path, f'{name}.csv')) or not exists(join(self.input_path, f'{name}.xlsx')):
+            return f'{name}.csv'
+        return f'{name}.xlsx'
+
+    def read_excel(self, filepath, usecols=None, nrows=20, rows=None):
+        """read the first sheet of an excel file straight into a dataframe, finding the header in the same pass
+
+        If enabled and reading all rows, the sheet is also saved as csv while reading and the excel file moved to the
+        redundant folder.
+
+        :param rows: positions of the rows below the header to read, None for all rows"""
+        args = self.get_sheet_args(filepath, usecols, nrows, rows)
+        outpath = args[4]
+        logger.debug(f'Reading Excel file{" and saving as csv" if outpath else ""}')
+        logger.debug(f'Columns: {usecols}')
+
+        future = self.reads.get(*args) if self.reads is not None and rows is None else None
+        if future is not None:  # read ahead in a worker process
+            logger.debug('Waiting for Excel file read ahead')
+            table = future.result()
+        else:
+            table = read_sheet(*args)
+
+        if outpath is not None:
+            self.move_excel([filepath])
+
+        # arrow nulls convert to None in object columns, use NaN as pandas does
+        return table.to_pandas().fillna(np.nan)
+
+    def get_sheet_args(self, filepath, usecols=None, nrows=20, rows=None):
+        """arguments of read_sheet for reading an excel file with the settings"""
+        strings = sorted(set(chain(*self.prim_cols.values(), *self.cust_cols.values())))
+        outpath = splitext(filepath)[0] + '.csv' if self.excel_csv and rows is None else None
+        return filepath, nrows, usecols, strings, outpath, rows
+
+    def read_ahead(self, filenames, kind='cust', workers=1, nrows=20):
+        """start reading excel files in worker processes ahead of loading them, as threads read one sheet at a time
+
+        :param workers: number of worker processes"""
+        jobs = [self.get_sheet_args(f'{self.input_path}/{filename}', self.usecols[kind], nrows)
+                for filename in filenames if self.is_excel(filename)]
+        if len(jobs) == 0:
+            return
+
+        logger.info(f'Reading {len(jobs)} Excel files with {min(workers, len(jobs))} worker processes\n')
+        self.reads = parallel.ReadPool(read_sheet, jobs, workers)
+
+    def stop_reads(self):
+        """stop excel reads not taken and shut down their worker processes"""
+        if self.reads is not None:
+            self.reads.close()
+            self.reads = None
+
+    def get_df(self, filename, kind='primary', sep=';', nrows=20, full=False):
+        """load and process dataframe from input folder
+
+        :param full: load all columns, otherwise only the columns used for matching and exports"""
+        text = 'primary' if kind == 'primary' else 'customer'
+        name = splitext(filename)[0]
+
         # load database
         logger.info(f'Loading {text} database... ')
-        logger.debug(f'Separator: {sep}')
         logger.debug(f'Looking for header in first {nrows} rows')
-        logger.debug(f'Skip to row: {skip}')
         time = perf_counter()
-        df_main = pd.read_csv(f'{self.input_path}/{filename}', sep=sep,
-                              skiprows=skip, low_memory=False).dropna(how='all')
-        if kind != 'primary':
-            df_main = df_main.reset_index().rename({'index': 'cust_index'}, axis=1)
+        with self.metrics.span('load', file=name, kind=kind) as span:
+            if self.is_excel(filename):  # header found while reading
+                df_main = self.read_excel(f'{self.input_path}/{filename}', None if full else self.usecols[kind], nrows)
+            else:
+                # get number of header rows to skip
+                skip = self.get_skip(f'{self.input_path}/{filename}', sep, nrows)
+                usecols = None if full else self.get_usecols(f'{self.input_path}/{filename}', skip, kind, sep)
+                logger.debug(f'Separator: {sep}')
+                logger.debug(f'Skip to row: {skip}')
+                logger.debug(f'Columns: {usecols}')
+                df_main = self.read_csv(f'{self.input_path}/{filename}', skip, usecols, sep)
+
+            df_main = df_main.dropna(how='all')
+            if kind != 'primary':
+                df_main = df_main.reset_index().rename({'index': 'cust_index'}, axis=1)
+            span.set(rows=len(df_main))
+        logger.debug(f'Main memory: {df_main.memory_usage(deep=True).sum() / 2 ** 20:.2f}MB')
         logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
 
         # clean dataframe
         logger.info(f'Cleaning {text} dataframe... ')
         time = perf_counter()
-        df_copy = self.clean_df(df_main, kind)
+        with self.metrics.span('clean', file=name, kind=kind) as span:
+            df_copy = self.clean_df(df_main, kind)
+            span.set(rows=len(df_copy))
 
         logger.debug(f'Main shape: {df_main.shape}  -  Copy shape: {df_copy.shape}')
         logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
 
         return df_main, df_copy
 
-    def convert_excel(self):
-        """convert excel files to csv for faster reading in pandas"""
+    def use_chunks(self, filename):
+        """check if a customer csv database is larger than the memory budget and should be streamed in chunks"""
+        if self.memory_budget <= 0 or self.is_excel(filename):
+            return False
+        return getsize(join(self.input_path, filename)) > self.memory_budget * 2 ** 20
 
-        csv_files = glob.glob(f'{self.input_path}/*.csv')
-        xl_files = glob.glob(f'{self.input_path}/*.xlsx')
-        commands = []
+    def get_chunksize(self, filepath, skip, sample=1000):
+        """estimate number of rows per chunk fitting in the memory budget from the mean size of the first rows"""
+        size, rows = 0, 0
+        with open(filepath, 'rb') as file:
+            for i, line in enumerate(file):
+                if i > skip + sample:
+                    break
+                if i > skip:
+                    size += len(line)
+                    rows += 1
 
-        logger.debug(f'Found {len(csv_files)} csv files')
-        logger.debug(f'Found {len(xl_files)} excel files to convert')
+        row_size = max(size / max(rows, 1), 1) * MEMORY_FACTOR
+        return max(int(self.memory_budget * 2 ** 20 / row_size), MIN_CHUNKSIZE)
 
-        # build list of functions for xlsx2csv.py
-        for filepath in xl_files:
-            filename = re.search(r'(.+[\\|/])(.+)(\.(csv|xlsx|xlx))', filepath)
-            # if not already converted and not temp file
-            if filename[0].replace('xlsx', 'csv') not in csv_files and not filename.group(2).startswith('~$'):
-                call = ["./xlsx2csv.py", filepath, join(self.input_path, filename.group(2) + '.csv'), "-d", ";"]
-                commands.append(call)
+    def get_chunks(self, filename, sep=';', nrows=20, dedupe=True):
+        """stream and clean a customer database in chunks sized by the memory budget
 
-        if len(commands) == 0:  # return if no excel files or all converted
-            self.move_excel(xl_files)
-            return
+        :param dedupe: drop duplicates within each chunk if enabled
+        :return: generator of main and cleaned dataframes for each chunk, indexed by cust_index across all chunks"""
+        filepath = f'{self.input_path}/{filename}'
+        skip = self.get_skip(filepath, sep, nrows)
+        chunksize = self.get_chunksize(filepath, skip)
+        usecols = self.get_usecols(filepath, skip, 'cust', sep)
 
-        logger.info('Converting Excel files to csv... ')
-        logger.debug(f'Built {len(commands)} commands')
+        logger.info(f'Streaming customer database in chunks of {chunksize} rows '
+                    f'(larger than memory budget of {self.memory_budget}MB)\n')
+        logger.debug(f'Separator: {sep}')
+        logger.debug(f'Skip to row: {skip}')
+        logger.debug(f'Columns: {usecols}')
+
+        # read matching columns as strings so types don't change between chunks
+        dtype = {col: str for col in chain(*self.cust_cols.values())}
+        reader = pd.read_csv(filepath, sep=sep, skiprows=skip, usecols=usecols, dtype=dtype, chunksize=chunksize)
+
+        for i, chunk in enumerate(reader):
+            logger.info(f'Cleaning customer chunk {i + 1}... ')
+            time = perf_counter()
+
+            with self.metrics.span('clean', file=splitext(filename)[0], kind='cust', chunk=i + 1) as span:
+                # chunk indices continue from the previous chunk, so cust_index is unique across the whole file
+                df_main = chunk.dropna(how='all').reset_index().rename({'index': 'cust_index'}, axis=1)
+                df_main.index = df_main['cust_index'].to_numpy()
+                df_copy = self.clean_df(df_main, 'cust', dedupe)
+                span.set(rows=len(df_copy))
+
+            logger.debug(f'Main shape: {df_main.shape}  -  Copy shape: {df_copy.shape}')
+            logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
+
+            yield df_main, df_copy
+
+    def get_rows(self, filename, rows, sep=';', nrows=20, chunksize=100_000):
+        """load all columns of a customer database for the given rows only, streaming the file in chunks
+
+        :param rows: cust_index of each row to load
+        :return: dataframe of the selected rows with their cust_index"""
+        filepath = f'{self.input_path}/{filename}'
+        rows = pd.Index(rows).unique()
+        if self.is_excel(filename):
+            # only the selected rows are kept, in sheet order, and the sheet is parsed up to the last of them
+            logger.debug(f'Loading {len(rows)} full customer rows from Excel file')
+            rows = rows.sort_values()
+            df = self.read_excel(filepath, nrows=nrows, rows=rows)
+            df.index = rows[:len(df)]
+            return df.reset_index().rename({'index': 'cust_index'}, axis=1)
+
+        skip = self.get_skip(filepath, sep, nrows)
+        if self.memory_budget > 0:
+            chunksize = self.get_chunksize(filepath, skip)
+
+        logger.debug(f'Loading {len(rows)} full customer rows in chunks of {chunksize} rows')
+        reader = pd.read_csv(filepath, sep=sep, skiprows=skip, chunksize=chunksize, dtype=str)
+        df = pd.concat([chunk[chunk.index.isin(rows)] for chunk in reader])
+
+        # infer types over the selected rows together, as chunks may infer different types for the same column, but
+        # keep matching columns as strings so phone numbers keep leading zeros as when loaded for matching
+        strings = set(chain(*self.prim_cols.values(), *self.cust_cols.values()))
+        numeric = [col for col in df.columns if col not in strings]
+        df[numeric] = df[numeric].apply(pd.to_numeric, errors='ignore')
+        return df.reset_index().rename({'index': 'cust_index'}, axis=1)
+
+    def get_primary(self, filename):
+        """load primary database from the index cache, rebuilding if file or settings changed"""
+        # only settings which change the cleaned primary dataframe invalidate the cache
+        key_settings = {'prim_cols': self.prim_cols, 'id': self.prim_id, 'phone_drop': self.phone_drop,
+                        'interest': self.prim_interest, 'usecols': self.usecols['primary'],
+                        'options': sorted(set(self.options).intersection({'i', 'd', 'z'}))}
+
+        logger.info('Loading primary index... ')
         time = perf_counter()
-        if sys.platform == "win32":
-            with Pool(cpu_count()) as pool:  # parallelize and convert
-                [pool.apply_async(xlsx2csv.run, args=call).get() for call in commands]
-        else:
-            [xlsx2csv.run(call) for call in commands]
-        logger.info(f'Done: {round(perf_counter() - time, 5)}s')
+        name = splitext(filename)[0]
+        with self.metrics.span('index', file=name) as span:
+            key = PrimaryIndex.get_key(join(self.input_path, filename), key_settings)
+            index = PrimaryIndex.load(self.cache_path, filename, key)
+            span.set(cached=index is not None)
+
+        if index is not None:
+            logger.debug(f'Main shape: {index.main.shape}  -  Copy shape: {index.copy.shape}')
+            logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
+            return index
+
+        logger.debug(f'Primary index not loaded: {round(perf_counter() - time, 5)}s')
+        # all columns are cached for the final exports, loaded only for the exported rows
+        df_full, df_copy = self.get_df(filename, kind='primary', full=True)
+        df_main = df_full[[col for col in df_full.columns if col in self.usecols['primary']]]
+
+        logger.info('Building primary index... ')
+        time = perf_counter()
+        with self.metrics.span('build', file=name, rows=len(df_copy)):
+            index = PrimaryIndex(df_main, df_copy, key, df_full)
+            index.save(self.cache_path, filename)
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
+
+        return index
 
-        self.move_excel(xl_files)
+    def get_fuzzy(self, prim_main, prim_copy):
+        """build blocking index of primary names for matching similar names"""
+        logger.info('Building fuzzy name index... ')
+        time = perf_counter()
+        with self.metrics.span('fuzzy index'):
+            df = prim_main[prim_main[self.prim_id].isin(prim_copy[self.prim_id])]
+            fuzzy = FuzzyIndex.build(df, self.prim_cols['n'], self.prim_id)
+
+        logger.debug(f'Fuzzy name blocks: {len(fuzzy.keys)}')
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
+        return fuzzy
 
     def move_excel(self, xl_files):
         if len(xl_files) == 0:
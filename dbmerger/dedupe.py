@@ -0,0 +1,83 @@
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# maximum number of candidate pairs checked at once
+BATCH_SIZE = 2 ** 22
+
+
+def encode(df):
+    """encode values as integers shared across columns, so equal values in any column have equal codes
+
+    :return: 2D array of codes, -1 for empty values"""
+    codes, _ = pd.factorize(df.to_numpy().ravel())
+    return codes.reshape(df.shape)
+
+
+def count_unique(codes):
+    """number of unique non-empty values in each row"""
+    codes = np.sort(codes, axis=1)
+    new = np.ones(codes.shape, dtype=bool)
+    new[:, 1:] = codes[:, 1:] != codes[:, :-1]
+    return (new & (codes >= 0)).sum(1)
+
+
+def get_candidates(codes, rows):
+    """pair rows with all rows holding their rarest value in the same column, as only these can contain them
+
+    :param rows: rows to find containing rows for
+    :return: generator of row and candidate containing row arrays, in batches"""
+    n, k = codes.shape
+    filled = codes >= 0
+    cells = codes.astype(np.int64) * k + np.arange(k)
+
+    # posting list of rows holding each value in each column, sorted by value
+    keys = cells[filled]
+    postings = np.broadcast_to(np.arange(n)[:, None], cells.shape)[filled]
+    order = np.argsort(keys, kind='stable')
+    keys, postings = keys[order], postings[order]
+
+    # anchor each row on its rarest value
+    start = np.searchsorted(keys, cells[rows], side='left')
+    stop = np.searchsorted(keys, cells[rows], side='right')
+    anchor = np.where(filled[rows], stop - start, n + 1).argmin(1)
+    start, stop = start[np.arange(len(rows)), anchor], stop[np.arange(len(rows)), anchor]
+
+    # split rows into batches of roughly BATCH_SIZE candidate pairs
+    total = np.cumsum(stop - start)
+    bounds = np.searchsorted(total, np.arange(BATCH_SIZE, total[-1] if len(total) else 0, BATCH_SIZE))
+    for batch in np.split(np.arange(len(rows)), bounds):
+        lengths = stop[batch] - start[batch]
+        offsets = np.repeat(start[batch] - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        yield np.repeat(rows[batch], lengths), postings[offsets]
+
+
+def subsumed(df):
+    """flag rows whose values are all found in the same columns of another row holding more unique values,
+    and repeats of identical rows after the first
+
+    :return: boolean array of rows to drop"""
+    codes = encode(df)
+    size = (codes >= 0).sum(1)
+    unique = count_unique(codes)
+
+    # identical rows, hashing each row of codes
+    drop = pd.DataFrame(codes).duplicated(keep='first').to_numpy() & (size > 0)
+    rows = np.flatnonzero(~drop & (size > 0))
+
+    # rows contained in a row with more info
+    for row, other in get_candidates(codes, rows):
+        more = unique[other] > unique[row]
+        row, other = row[more], other[more]
+        contained = ((codes[row] < 0) | (codes[row] == codes[other])).all(1)
+        drop[row[contained]] = True
+
+    return drop
@@ -3,13 +3,17 @@ import logging
 import os
 import re
 import sys
+from datetime import datetime as dt
 from itertools import chain
-from os.path import join
+from os.path import basename, join
 from time import perf_counter
 
 import numpy as np
 import pandas as pd
-from openpyxl import load_workbook
+
+from dbmerger.metrics import Metrics, peak_memory
+from dbmerger.phones import PhoneNormaliser
+from dbmerger.writer import get_slug, write_csv, write_excel, write_manifest, write_parquet
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -41,12 +45,20 @@ class Export:
         self.phone_drop = settings['phone_drop']
         self.phone_sort = settings['phone_sort']
         self.title_drop = settings['title_drop']
+        self.phones = PhoneNormaliser(settings['phone_drop'], settings['phone_sort'])
 
         # directories
         self.check_path = settings['check']
         self.final_path = settings['final']
         self.open = settings['open']
 
+        # formats of the final export, and excel files written in write-only mode streaming rows to disk if enabled
+        self.export_format = settings['export_format']
+        self.streaming = settings['streaming_export']
+
+        # timings of each stage, written to the log folder when run as a program
+        self.metrics = Metrics()
+
         # create directories as needed
         if not os.path.exists(self.check_path):
             logging.debug(f'Creating check path at {self.check_path}')
@@ -56,7 +68,7 @@ class Export:
             logging.debug(f'Creating final path at {self.final_path}')
             os.makedirs(self.final_path)
 
-        logger.debug(f'========== Export object instantiated ==========\n{json.dumps(self.__dict__, indent=2)}')
+        logger.debug(f'========== Export object instantiated ==========\n{json.dumps(self.__dict__, indent=2, default=vars)}')
 
     def check(self, filename, same, diff, none):
         """Export 3 match conditions dataframes to excel sheet"""
@@ -73,10 +85,10 @@ class Export:
         i = 0
         while True:
             try:
-                with pd.ExcelWriter(filepath) as writer:  # export to excel
-                    same.set_index(self.prim_id).to_excel(writer, sheet_name='Perfect Match')
-                    diff.set_index(self.prim_id).to_excel(writer, sheet_name='Uncertain Match')
-                    none.set_index(self.prim_id).to_excel(writer, sheet_name='Missing Data')
+                with self.metrics.span('check'):
+                    self.write_excel(filepath, {'Perfect Match': same.set_index(self.prim_id),
+                                                'Uncertain Match': diff.set_index(self.prim_id),
+                                                'Missing Data': none.set_index(self.prim_id)}, index=True)
                 break
             except PermissionError:  # prompt user to close file before continuing
                 if 'q' not in self.options:
@@ -92,16 +104,13 @@ class Export:
         logger.debug(f"Match cases exported to: \n{filepath}\n")
         print('-' * 88, '\n')
 
-    def mail(self, filename, matches, prim_main, cust_main, kind='perfect'):
-        """Add mailing list sheet to final export"""
-
-        filename += '_final'
+    def mail(self, matches, prim_main, cust_main, kind='perfect'):
+        """Create mailing list sheets for the final export
 
+        :return: dict of sheet names to mailing list and missing emails list dataframes"""
         logger.info(f'Processing {kind.lower()} mailing list...')
         print()
-        logger.debug(f'Filename: {filename}.xlsx')
         logger.debug(f'Shapes: matches {matches.shape}, primary {prim_main.shape}, cust {cust_main.shape}')
-        filepath = join(self.final_path, f'{filename}.xlsx')
 
         # merge data
         logger.debug('Merging data')
@@ -129,54 +138,29 @@ class Export:
         mail_list = self.get_mailing_email(mail_list, email_cols)
         mail_list = self.get_mailing_phones(mail_list, phone_cols)
         mail_list = self.get_mailing_greetings(mail_list)
-        mail_list = self.drop_mail_dupes(mail_list, email_cols, phone_cols)
+        with self.metrics.span('mail dupes') as span:
+            mail_list = self.drop_mail_dupes(mail_list, email_cols, phone_cols)
+            span.set(rows=len(mail_list))
 
         # drop empty columns
         mail_list = mail_list.replace(r'\s+( +\.)', np.nan, regex=True).replace('', np.nan)
 
-        # split sheets for those with emails
-        missing_list = mail_list[mail_list['Email 1'].isna()].dropna(how='all', axis=1)
-        mail_list = mail_list[mail_list['Email 1'].notna()].dropna(how='all', axis=1)
+        # split sheets for those with emails, keeping all columns of an empty sheet
+        missing_list = mail_list[mail_list['Email 1'].isna()]
+        mail_list = mail_list[mail_list['Email 1'].notna()]
+        missing_list = missing_list.dropna(how='all', axis=1) if len(missing_list) > 0 else missing_list
+        mail_list = mail_list.dropna(how='all', axis=1) if len(mail_list) > 0 else mail_list
 
-        print('-' * 88, sep='')
-        logger.info('Exporting mailing list...')
-        i = 0
-        while True:  # save
-            try:
-                book = load_workbook(filepath)  # load final matches spreadsheet
-                with pd.ExcelWriter(filepath, engine='openpyxl') as writer:  # export to excel
-                    writer.book = book  # add final matches
-                    writer.sheets = {ws.title: ws for ws in book.worksheets}  # rename sheets
-                    mail_list.sort_values(by=self.prim_id).to_excel(writer, index=False,
-                                                                    sheet_name=f'{kind.title()} Mailing List')
-                    missing_list.sort_values(by=self.prim_id).to_excel(writer, index=False,
-                                                                       sheet_name=f'{kind.title()} Missing Emails List')
-                break
-            except PermissionError:  # prompt user to close file before continuing
-                if 'q' not in self.options:
-                    logger.error(f'ERROR: close the file {filename}.xlsx and hit enter to continue: ')
-                    input()
-                    print('\nRetrying...')
-                else:
-                    i += 1
-                    filename += f'_{i}'
-                    filepath = join(self.final_path, f'{filename}.xlsx')
+        return {f'{kind.title()} Mailing List': mail_list.sort_values(by=self.prim_id),
+                f'{kind.title()} Missing Emails List': missing_list.sort_values(by=self.prim_id)}
 
-        print(f"Added mailing list sheets to final matches export: \n{filepath}")
-        logger.debug(f"Added mailing list sheets to final matches export: \n{filepath}\n")
-        print('-' * 88, '\n')
+    def final(self, final_matches, prim_main, cust_main):
+        """Create final primary and customer data sheets
 
-    def final(self, filename, final_matches, prim_main, cust_main):
-        """Create and save final excel sheet"""
-
-        filename += '_final'
-
-        print('-' * 88)
-        logger.info('Exporting final matches...')
-        logger.debug(f'Filename: {filename}.xlsx')
+        :return: dict of sheet names to dataframes"""
+        logger.info('Processing final matches...')
         logger.debug(f'Shapes: final_matches {final_matches.shape}, primary {prim_main.shape}, cust {cust_main.shape}')
 
-        filepath = join(self.final_path, f'{filename}.xlsx')
         final_IDs = final_matches[[self.prim_id, 'cust_index']]
 
         # filter original dataframes
@@ -205,29 +189,100 @@ class Export:
                 cust = primary[primary.columns[len(prim_cols) + 1:]]
                 primary = primary[primary.columns[:len(prim_cols)]]
 
+        sheets = {'Primary Data': primary}
+        if 'a' in self.options:  # append customer data to separate sheet
+            sheets['Customer Data'] = cust
+        return sheets
+
+    def save(self, filename, sheets):
+        """Save all sheets of the final export in each export format, each file written once
+
+        Excel sheets are saved to one workbook, columnar formats to a folder with one file per sheet and a manifest."""
+
+        source = filename
+        filename += '_final'
+
+        print('-' * 88)
+        logger.info('Exporting final matches...')
+        logger.debug(f'Filename: {filename}, formats: {", ".join(self.export_format)}')
+        logger.debug(f'Sheets: {", ".join(f"{name} {df.shape}" for name, df in sheets.items())}')
+
         logger.debug(f'Saving final...')
         i = 0
         while True:
             try:
-                with pd.ExcelWriter(filepath) as writer:  # export to excel
-                    primary.to_excel(writer, index=False, sheet_name='Primary Data')
-                    if 'a' in self.options:  # append customer data to separate sheet
-                        cust.to_excel(writer, index=False, sheet_name='Customer Data')
+                paths = self.write_final(source, filename, sheets)
                 break
             except PermissionError:  # prompt user to close file before continuing
                 if 'q' not in self.options:
-                    logger.error(f'ERROR: close the file {filename}.xlsx and hit enter to continue: ')
+                    logger.error(f'ERROR: close the file {filename} and hit enter to continue: ')
                     input()
                     print('\nRetrying...')
                 else:
                     i += 1
                     filename += f'_{i}'
-                    filepath = join(self.final_path, f'{filename}.xlsx')
 
-        print(f"Final matches exported to: \n{filepath}")
-        logger.debug(f"Final matches exported to: \n{filepath}\n")
+        paths = '\n'.join(paths)
+        print(f"Final matches exported to: \n{paths}")
+        logger.debug(f"Final matches exported to: \n{paths}\n")
         print('-' * 88, '\n')
 
+    def write_final(self, source, filename, sheets):
+        """write the final export in each export format
+
+        :param source: name of the customer file exported
+        :return: list of paths written"""
+        paths = []
+        if 'xlsx' in self.export_format:
+            paths.append(join(self.final_path, f'{filename}.xlsx'))
+            self.write_excel(paths[-1], sheets)
+
+        columnar = [kind for kind in self.export_format if kind != 'xlsx']
+        if len(columnar) == 0:
+            return paths
+
+        folder = join(self.final_path, filename)
+        os.makedirs(folder, exist_ok=True)
+        time = perf_counter()
+        rows = sum(len(df) for df in sheets.values())
+        with self.metrics.span('write', format=', '.join(columnar), rows=rows):
+            manifest = {'source': source, 'created': dt.now().isoformat(timespec='seconds'),
+                        'formats': self.export_format, 'excel': basename(paths[0]) if len(paths) > 0 else None,
+                        'sheets': []}
+            for name, df in sheets.items():
+                files = {kind: f'{get_slug(name)}.{kind}' for kind in columnar}
+                for kind, file in files.items():
+                    write = write_parquet if kind == 'parquet' else write_csv
+                    write(join(folder, file), df)
+                manifest['sheets'].append({'name': name, 'rows': len(df),
+                                           'columns': [str(col) for col in df.columns], 'files': files})
+
+            paths.append(folder)
+            write_manifest(join(folder, 'manifest.json'), manifest)
+        logger.info(f'Wrote {rows} rows as {", ".join(columnar)} in {round(perf_counter() - time, 5)}s')
+        return paths
+
+    def write_excel(self, filepath, sheets, index=False):
+        """write dataframes to the sheets of an excel file, logging the write time and peak memory used"""
+        logger.debug(f'Writing {"streaming" if self.streaming else "standard"} excel file')
+        time = perf_counter()
+        start_peak = peak_memory()
+        rows = sum(len(df) for df in sheets.values())
+
+        with self.metrics.span('write', format='xlsx', rows=rows, streaming=self.streaming):
+            if self.streaming:  # write-only workbook, rows streamed to disk in chunks
+                write_excel(filepath, sheets, index=index)
+            else:
+                with pd.ExcelWriter(filepath) as writer:  # export to excel
+                    for name, df in sheets.items():
+                        df.to_excel(writer, index=index, sheet_name=name)
+
+        message = f'Wrote {rows} rows in {round(perf_counter() - time, 5)}s'
+        if start_peak is not None:  # peak memory of the process, raised if the export used more than any step before
+            end_peak = peak_memory()
+            message += f' - peak memory {end_peak:.1f}MB (+{end_peak - start_peak:.1f}MB)'
+        logger.info(message)
+
     def drop_mail_dupes(self, mail_list, email_cols, phone_cols):
         """merge data from duplicate entries, with duplicates determined as those with matching cust_index"""
         logger.info('Merging duplicates... ')
@@ -239,56 +294,37 @@ class Export:
         mail_list.drop_duplicates(inplace=True)
         # get list of duplicated customer indices
         dupes = mail_list[mail_list.duplicated(subset='cust_index')]
-        indices = set(dupes['cust_index'].values)
-        logger.debug(f'{len(dupes)} duplicates found - {len(indices)} unique')
-
-        def condense(i, cols, kind='phone'):
-            """get condensed list of unique data for a customer index"""
-            # list of all values that are not null
-            values = set([x for x in mail_list[mail_list['cust_index'] == i][cols].values.flatten() if len(x) > 0])
-            if kind == 'phone':
-                clean_numbers = {re.sub(r"[^0-9]+", '', num): num for num in values
-                                 if len(re.sub(r"[^0-9]+", '', num)) > 0}
-                return list(clean_numbers.values())
-            else:
-                return [email.strip() for email in values if len(email.strip()) > 1]
-
-        def unique_titles(i):  # get condensed string of unique titles
-            """get unique titles from from a given dataframe index"""
-            # convert values to string
-            titles = ' '.join(mail_list[mail_list['cust_index'] == i][self.prim_title].values.flatten())
-            # split values
-            titles = [i.strip() for i in titles.split('.')]
-            # get unique titles
-            unique = set(title.lower() for title in titles if len(title) > 1)
-            reduced = []
-            for title in titles:
-                if title.lower() in unique:  # if title is unique
-                    reduced.append(title + '.')
-                    unique.remove(title.lower())  # remove form unique list
-            return ' '.join(reduced)  # return string of titles
+        rows = mail_list[mail_list['cust_index'].isin(dupes['cust_index'])]
+        logger.debug(f'{len(dupes)} duplicates found - {rows["cust_index"].nunique()} unique')
 
-        # merge unique data for each data
+        # merge unique data for each duplicated customer index, in order of first appearance
         logger.debug('Merging data')
-        emails = {idx: condense(idx, email_cols, 'email') for idx in indices}
-        phones = {idx: condense(idx, phone_cols, 'phone') for idx in indices}
-        titles = {idx: unique_titles(idx) for idx in indices}
+        emails = self.get_long(rows, email_cols)
+        emails['value'] = emails['value'].str.strip()
+        emails = emails[emails['value'].str.len() > 1]
+
+        phones = self.get_long(rows, phone_cols)
+        phones['clean'] = self.phones.normalise(phones['value'])[0]
+        phones = phones[phones['clean'].str.len() > 0]
+        # numbers with the same digits are kept once, in place of the first, with the last format given
+        phones = phones.groupby(['cust_index', 'clean'], sort=False)['value'].last().reset_index()
+
+        titles = rows.groupby('cust_index', sort=False)[self.prim_title].agg(' '.join).str.split('.')
+        titles = titles.explode().str.strip().rename('value').reset_index()
+        titles = titles[titles['value'].str.len() > 1]
+        # titles are unique regardless of case, keeping the first
+        titles = titles[~titles.assign(value=titles['value'].str.lower()).duplicated()]
+        titles = (titles['value'] + '.').groupby(titles['cust_index'], sort=False).agg(' '.join)
 
         logger.debug('Creating dataframes')
-        # rename columns and create dataframes for each collection of merged data
-        new_cols = [f'Email {i + 1}' for i in range(max(len(v) for i, v in enumerate(emails.values())))]
-        emails_df = pd.DataFrame.from_dict(emails, orient='index', columns=new_cols)
-        new_cols = [f'Phone Number {i + 1}' for i in range(max(len(v) for i, v in enumerate(phones.values())))]
-        phones_df = pd.DataFrame.from_dict(phones, orient='index', columns=new_cols)
-        titles_df = pd.DataFrame.from_dict(titles, orient='index', columns=[self.prim_title])
-
-        # create dataframe of all merged data
-        all_df = pd.concat([emails_df, phones_df, titles_df], axis=1)
+        # create dataframe of all merged data, with numbered columns for each collection of merged data
+        all_df = pd.concat([self.get_wide(emails, 'Email'), self.get_wide(phones, 'Phone Number'),
+                            titles.rename(self.prim_title)], axis=1)
 
         # extract non-merged columns for merged data and join merged
-        dupes = dupes[set(dupes.columns) - {*email_cols, *phone_cols, self.prim_title}].set_index('cust_index')
-        dupes = dupes.join(all_df).reset_index().rename(columns={'index': 'cust_index'})
-        dupes.drop_duplicates(subset='cust_index', inplace=True)
+        dupes = dupes[[col for col in dupes.columns if col not in {*email_cols, *phone_cols, self.prim_title}]]
+        dupes = dupes.drop_duplicates(subset='cust_index').join(all_df, on='cust_index')
+        dupes[self.prim_title] = dupes[self.prim_title].fillna('')
 
         logger.debug('Renaming contact data columns')
         # rename mail_list columns to match dupe data
@@ -305,6 +341,25 @@ class Export:
         logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
         return pd.concat([mail_list, dupes], axis=0, ignore_index=True)
 
+    @staticmethod
+    def get_long(rows, cols):
+        """unique non-empty values of the given columns for each customer index, in order of first appearance
+
+        :return: dataframe with cust_index and value columns"""
+        values = pd.Series(rows[cols].to_numpy().ravel(), dtype=object)
+        long = pd.DataFrame({'cust_index': np.repeat(rows['cust_index'].to_numpy(), len(cols)), 'value': values})
+        long = long[long['value'].str.len() > 0]
+        return long.drop_duplicates()
+
+    @staticmethod
+    def get_wide(long, name):
+        """spread values for each customer index across numbered columns, e.g. 'Email 1', 'Email 2'
+
+        :return: dataframe indexed by cust_index"""
+        number = long.groupby('cust_index', sort=False).cumcount() + 1
+        wide = long.set_index(['cust_index', number])['value'].unstack()
+        return wide.rename(columns=lambda n: f'{name} {n}').rename_axis(index=None, columns=None)
+
     def get_mailing_email(self, mail_list, cols):
         """sort and drop duplicate emails per index in mailing list"""
         if len(cols) <= 1:
@@ -316,23 +371,27 @@ class Export:
         # missing emails placed at end of order
         email_order['@'] = len(self.email_sort) + 1
 
-        def sort_emails(emails):
-            # returns sorted list of emails according to above order
-            # emails not in order dict i.e. good emails, placed at position 0
-            max_len = len(emails)
-            emails = set([x.lower().replace(' ', '') for x in emails if '@' in x])
-            sorted_emails = sorted(emails, key=lambda c: email_order.get(c.split('@')[0] + '@', 0))
-            return pd.Series(sorted_emails + [''] * (max_len - len(sorted_emails)))
-
         logger.info('Sorting emails... ')
         logger.debug(f'Email Order: {email_order}')
+        time = perf_counter()
 
-        try:  # apply sort per row of numpy array
-            time = perf_counter()
-            mail_list[cols] = mail_list[cols].fillna('').apply(lambda x: sort_emails(x), axis=1).to_numpy()
-            logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
-        except ValueError:
-            logger.exception('Error: Skipping email sorting (ValueError: df is empty)\n')
+        # stack emails of all rows into one long table, normalised and unique per row
+        emails = pd.DataFrame({'row': np.repeat(np.arange(len(mail_list)), len(cols)),
+                               'email': mail_list[cols].fillna('').astype(str).to_numpy().ravel()})
+        emails = emails[emails['email'].str.contains('@', regex=False)]
+        emails['email'] = emails['email'].str.lower().str.replace(' ', '', regex=False)
+        emails = emails.drop_duplicates()
+
+        # emails not in order dict i.e. good emails, placed at position 0, keeping their order within each rank
+        rank = (emails['email'].str.split('@', n=1).str[0] + '@').map(email_order).fillna(0).to_numpy()
+        emails = emails.iloc[np.lexsort((rank, emails['row'].to_numpy()))]
+
+        # place sorted emails back into columns, padded with empty strings
+        sorted_emails = np.full((len(mail_list), len(cols)), '', dtype=object)
+        position = emails.groupby('row').cumcount().to_numpy()
+        sorted_emails[emails['row'].to_numpy(), position] = emails['email'].to_numpy()
+        mail_list[cols] = sorted_emails
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
 
         return mail_list
 
@@ -342,57 +401,36 @@ class Export:
             logger.debug('Skipping sort phones: cols length = 1')
             return mail_list
 
-        # enumerate order of items in phone drop list to dict
-        phone_order = {c: p + 1 for (p, c) in enumerate(self.phone_sort)}
-
-        # define regex conditions based on sort and drop
-        rgx_sort = '|'.join([f'^{pre}' for pre in self.phone_sort])
-        rgx_drop = '|'.join([f'^{pre}' for pre in self.phone_drop])
-
-        def sort_phones(phones):
-            """returns sorted list of phone numbers according to above order,
-            numbers not in order dict placed at penultimate position"""
-
-            # drop duplicates
-            max_len = len(phones)
-            phones = set(phones)
-
-            # clean: keep only digits in numbers
-            clean_raw = {re.sub(r'[^0-9]+', '', num): num for num in phones if len(num) > 0}
-
-            # drop duplicate numbers if missing prefixes
-            for num in list(clean_raw.keys()):
-                num_trunc = re.sub(rgx_drop, "", num)
-                if num_trunc != num and num_trunc in clean_raw.keys():
-                    del clean_raw[num_trunc]
-
-            # extract prefixes from raw numbers
-            raw_prefixes = {num: num_clean.replace(re.sub(rgx_sort, "", num_clean), '')
-                            for num_clean, num in clean_raw.items()}
-
-            def get_order(number):
-                """get the position of a given number"""
-                if len(number) == 0:
-                    return len(self.phone_sort) + 2
-                else:
-                    return phone_order.get(raw_prefixes.get(number, 'none'), len(self.phone_sort) + 1)
-
-            # sort phone numbers
-            sorted_phones = sorted(clean_raw.values(), key=lambda c: get_order(c))
-
-            # add extra empty strings to match length for numpy function to work
-            return pd.Series(sorted_phones + [''] * (max_len - len(sorted_phones)))
-
         logger.info('Sorting phone numbers... ')
-        logger.debug(f'Phone Order: {phone_order}')
-        logger.debug(f'Removing titles with regex: {rgx_drop}')
-
-        try:  # apply sort per row of numpy array
-            time = perf_counter()
-            mail_list[cols] = mail_list[cols].fillna('').apply(lambda x: sort_phones(x), axis=1).to_numpy()
-            logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
-        except ValueError:
-            logger.exception('Error: Skipping phone sorting (ValueError: array is empty)\n')
+        logger.debug(f'Phone Order: {self.phone_sort}')
+        logger.debug(f'Dropping prefixes: {self.phone_drop}')
+        time = perf_counter()
+
+        # stack numbers of all rows into one long table, unique per row
+        phones = pd.DataFrame({'row': np.repeat(np.arange(len(mail_list)), len(cols)),
+                               'phone': mail_list[cols].fillna('').to_numpy().ravel()})
+        phones = phones[phones['phone'].str.len() > 0].drop_duplicates()
+        phones['digits'], phones['truncated'], phones['rank'] = self.phones.normalise(phones['phone'])
+
+        # keep each number once, in place of the first, with the last format given
+        phones['phone'] = phones.groupby(['row', 'digits'])['phone'].transform('last')
+        phones = phones.drop_duplicates(subset=['row', 'digits'])
+
+        # drop duplicate numbers if missing prefixes
+        prefixed = phones[phones['truncated'] != phones['digits']]
+        missing = pd.MultiIndex.from_arrays([phones['row'], phones['digits']]).isin(
+            pd.MultiIndex.from_arrays([prefixed['row'], prefixed['truncated']]))
+        phones = phones[~missing]
+
+        # numbers without a sort prefix placed after those with one, keeping their order within each rank
+        phones = phones.iloc[np.lexsort((phones['rank'].to_numpy(), phones['row'].to_numpy()))]
+
+        # place sorted numbers back into columns, padded with empty strings
+        sorted_phones = np.full((len(mail_list), len(cols)), '', dtype=object)
+        position = phones.groupby('row').cumcount().to_numpy()
+        sorted_phones[phones['row'].to_numpy(), position] = phones['phone'].to_numpy()
+        mail_list[cols] = sorted_phones
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
 
         return mail_list
 
@@ -0,0 +1,296 @@
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# german characters spelled out as they are when typed without them, before any other accents are stripped
+TRANSLITERATE = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+
+# n-gram blocks shared by more primary entries than this are too common to narrow down candidates, and are skipped
+MAX_BLOCK = 100
+
+# number of candidate pairs scored at once
+BATCH_SIZE = 2 ** 16
+
+# trigrams are encoded in base 28: 0 for padding, 1-26 for letters, 27 for the start and end of a name
+BASE = 28
+
+
+def normalise(names):
+    """lower case, spell out german characters, strip accents, and drop all but letters, cleaning each unique name once"""
+    names = names.fillna('').astype(str)
+    uniques = pd.Series(pd.unique(names), dtype=object)
+    clean = uniques.str.lower().str.translate(TRANSLITERATE)
+    clean = clean.str.normalize('NFKD').str.encode('ascii', errors='ignore').str.decode('ascii')
+    clean = clean.str.replace(r'[^a-z]+', '', regex=True)
+    return names.map(dict(zip(uniques, clean)))
+
+
+def cologne(name):
+    """Kölner Phonetik code of a normalised name, giving the same code to names which sound alike in german"""
+    codes = []
+    for i, char in enumerate(name):
+        prev = name[i - 1] if i > 0 else ''
+        after = name[i + 1] if i < len(name) - 1 else ''
+
+        if char in 'aeijouy':
+            code = '0'
+        elif char == 'h':
+            continue
+        elif char == 'b' or (char == 'p' and after != 'h'):
+            code = '1'
+        elif char in 'dt':
+            code = '8' if after in ('c', 's', 'z') else '2'
+        elif char in 'fvw' or char == 'p':
+            code = '3'
+        elif char in 'gkq':
+            code = '4'
+        elif char == 'c':
+            if i == 0:
+                code = '4' if after and after in 'ahkloqrux' else '8'
+            else:
+                code = '4' if after and after in 'ahkoqux' and prev not in ('s', 'z') else '8'
+        elif char == 'x':
+            code = '8' if prev and prev in 'ckq' else '48'
+        elif char == 'l':
+            code = '5'
+        elif char in 'mn':
+            code = '6'
+        elif char == 'r':
+            code = '7'
+        else:  # s, z
+            code = '8'
+        codes.append(code)
+
+    # collapse repeated codes, then drop vowels apart from at the start
+    code = ''.join(codes)
+    code = ''.join(c for i, c in enumerate(code) if i == 0 or c != code[i - 1])
+    return code[:1] + code[1:].replace('0', '')
+
+
+def phonetics(names):
+    """Kölner Phonetik codes for a series of normalised names, coding each unique name once"""
+    uniques = pd.unique(names)
+    return names.map(dict(zip(uniques, map(cologne, uniques))))
+
+
+def encode(names, width=None):
+    """encode normalised names as rows of letter codes 1-26, with 27 between names, padded with 0 to the longest
+
+    :return: code matrix and name lengths"""
+    lengths = names.str.len().to_numpy()
+    width = width or max(int(lengths.max(initial=0)), 1)
+    joined = ''.join(name.ljust(width, '\0')[:width] for name in names).encode('latin-1')
+    codes = np.frombuffer(joined, dtype=np.uint8).reshape(len(names), width)
+    return np.where(codes > 0, codes - 96, 0).astype(np.uint8), np.minimum(lengths, width)
+
+
+def trigrams(names):
+    """trigrams of each normalised name padded with its start and end, encoded as integers
+
+    :return: trigram codes and the row of the name each belongs to"""
+    codes, lengths = encode(names)
+    rows = np.arange(len(names))
+
+    # pad with start and end markers, so a name of n letters has n trigrams
+    padded = np.zeros((len(names), codes.shape[1] + 2), dtype=np.int64)
+    padded[:, 0] = BASE - 1
+    padded[:, 1:-1] = codes
+    padded[rows, lengths + 1] = BASE - 1
+
+    grams = padded[:, :-2] * BASE ** 2 + padded[:, 1:-1] * BASE + padded[:, 2:]
+    valid = np.arange(grams.shape[1]) < lengths[:, None]
+    return grams[valid], np.broadcast_to(rows[:, None], grams.shape)[valid]
+
+
+def histogram(codes):
+    """count of each letter code in each row of a code matrix"""
+    cells = np.repeat(np.arange(len(codes), dtype=np.int64) * BASE, codes.shape[1]) + codes.ravel()
+    counts = np.bincount(cells, minlength=len(codes) * BASE).reshape(len(codes), BASE).astype(np.int16)
+    counts[:, 0] = 0
+    return counts
+
+
+def levenshtein(a, b, len_a, len_b):
+    """edit distance between each row of two letter code matrices, vectorised over rows"""
+    n = len(b)
+    a = a[:, :max(int(len_a.max(initial=0)), 1)].T.copy()
+    b = b[:, :max(int(len_b.max(initial=0)), 1)].T.copy()
+    pairs = np.arange(n)
+    dist = np.where(len_a == 0, len_b, 0)
+
+    # dynamic programming over rows of letters in a, with pairs as the last axis so each step is contiguous
+    prev = np.repeat(np.arange(len(b) + 1, dtype=np.int16)[:, None], n, axis=1)
+    cur = np.empty_like(prev)
+    for i in range(1, len(a) + 1):
+        # substitutions and deletions from the previous row, then insertions along this row
+        cur[0] = i
+        np.minimum(prev[1:] + 1, prev[:-1] + (a[i - 1] != b), out=cur[1:])
+        for j in range(1, len(b) + 1):
+            np.minimum(cur[j], cur[j - 1] + 1, out=cur[j])
+
+        done = len_a == i
+        dist[done] = cur[len_b[done], pairs[done]]
+        prev, cur = cur, prev
+
+    return dist
+
+
+def join_names(names):
+    """join normalised names of each row, separated by a character encoded after the letters"""
+    return pd.Series(['{'.join(parts) for parts in zip(*names)], dtype=object)
+
+
+def combine(phones, sizes, skip=None):
+    """combine integer phonetic codes of several names into one integer for each row
+
+    :param sizes: number of possible codes for each name
+    :param skip: position of a name to leave out
+    :return: combined codes, or -1 for rows with any unknown code"""
+    combined = np.zeros(len(phones[0]), dtype=np.int64)
+    for i, (phone, size) in enumerate(zip(phones, sizes)):
+        if i != skip:
+            combined = np.where((combined < 0) | (phone < 0), -1, combined * size + phone)
+    return combined
+
+
+class FuzzyIndex:
+    """Blocking index over normalised primary names, finding similar names without comparing every pair
+
+    Candidates share a block if all their names sound alike by Kölner Phonetik, or if one name shares a trigram
+    while the others sound alike. Only candidates within a block are scored by edit distance."""
+
+    def __init__(self, ids, id_col, keys, rows, phones, others, codes, lengths):
+        self.ids = ids
+        self.id_col = id_col
+        self.keys = keys
+        self.rows = rows
+        self.phones = phones
+        self.others = others
+        self.codes = codes
+        self.lengths = lengths
+        self.counts = histogram(codes)
+
+    @staticmethod
+    def get_parts(df, cols):
+        """normalised names and their phonetic codes for each name column"""
+        names = [normalise(df[col]).reset_index(drop=True) for col in cols]
+        codes = [phonetics(name) for name in names]
+        return names, codes
+
+    @staticmethod
+    def get_keys(names, phones, sizes, others):
+        """block keys of each row from the phonetic codes of all names, and from each name's trigrams with
+        the phonetic codes of the other names
+
+        :param phones: integer phonetic codes of each name
+        :param sizes: number of phonetic codes of each name in the primary database
+        :param others: lookups of combined phonetic codes in the primary database,
+            for all names but each name in turn, then for all names
+        :return: block keys and the row each belongs to"""
+        keys, rows = [], []
+        for i, lookup in enumerate(others):
+            other = combine(phones, sizes, skip=i)
+            other = np.where(other < 0, -1, lookup.get_indexer(other))
+
+            if i == len(names):  # all names
+                key, row = np.zeros(len(other), dtype=np.int64), np.arange(len(other))
+            else:
+                key, row = trigrams(names[i])
+
+            # combine into one integer of phonetic code, name position, and trigram, skipping unknown codes
+            known = other[row] >= 0
+            keys.append((other[row][known].astype(np.int64) << 20) | (i << 15) | key[known])
+            rows.append(row[known])
+
+        return np.concatenate(keys), np.concatenate(rows)
+
+    @classmethod
+    def build(cls, df, cols, id_col, max_block=MAX_BLOCK):
+        """build blocking index from the name columns of the primary database"""
+        names, codes = cls.get_parts(df, cols)
+        lookups = [pd.Index(code.unique()) for code in codes]
+        phones = cls.get_phones(codes, lookups)
+        sizes = [len(lookup) for lookup in lookups]
+        others = [pd.Index(pd.unique(combine(phones, sizes, skip=i))) for i in range(len(names) + 1)]
+        keys, rows = cls.get_keys(names, phones, sizes, others)
+
+        # drop trigram blocks too common to be useful, keeping all blocks of names which sound alike
+        order = np.argsort(keys)
+        keys, rows = keys[order], rows[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        counts = np.diff(np.r_[starts, len(keys)])
+        keep = (np.repeat(counts, counts) <= max_block) | (((keys >> 15) & 31) == len(names))
+
+        codes, lengths = encode(join_names(names))
+        return cls(df[id_col].to_numpy(), id_col, keys[keep], rows[keep], lookups, others, codes, lengths)
+
+    @staticmethod
+    def get_phones(codes, lookups):
+        """integer phonetic codes of each name from the lookups of codes in the primary database, -1 if unknown"""
+        return [lookup.get_indexer(code) for lookup, code in zip(lookups, codes)]
+
+    def candidates(self, keys, rows, lengths, threshold):
+        """all pairs of primary and customer rows sharing a block with names of similar enough length
+
+        :param lengths: length of customer names
+        :return: primary and customer rows of each pair, without duplicates"""
+        order = np.argsort(keys)  # sorted lookups are faster
+        keys, rows = keys[order], rows[order]
+        start = np.searchsorted(self.keys, keys, side='left')
+        counts = np.searchsorted(self.keys, keys, side='right') - start
+
+        # expand each customer key to its range of primary rows
+        offsets = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        prim_rows, cust_rows = self.rows[offsets], np.repeat(rows, counts)
+        logger.debug(f'Fuzzy name candidates: {len(prim_rows)}')
+
+        # names differing in length by more than the threshold allows can't be similar enough
+        prim_lengths, cust_lengths = self.lengths[prim_rows], lengths[cust_rows]
+        longest = np.maximum(np.maximum(prim_lengths, cust_lengths), 1)
+        close = np.abs(prim_lengths - cust_lengths) <= (1 - threshold) * longest + 1e-9
+
+        n = max(len(lengths), 1)
+        pairs = pd.unique(prim_rows[close].astype(np.int64) * n + cust_rows[close])
+        return pairs // n, pairs % n
+
+    def match(self, df, cols, key_col, threshold):
+        """score candidate pairs of similar names between a customer database and the primary database
+
+        :param threshold: minimum similarity to keep a pair, 1 - edit distance / length of the longer name
+        :return: dataframe of primary ID, customer key, and name similarity for each pair kept"""
+        names, codes = self.get_parts(df, cols)
+        sizes = [len(lookup) for lookup in self.phones]
+        keys, rows = self.get_keys(names, self.get_phones(codes, self.phones), sizes, self.others)
+        codes, lengths = encode(join_names(names))
+        prim_rows, cust_rows = self.candidates(keys, rows, lengths, threshold)
+        longest = np.maximum(np.maximum(self.lengths[prim_rows], lengths[cust_rows]), 1)
+
+        # each edit changes the letter counts by at most 2, so a large difference rules out a pair before scoring
+        counts = histogram(codes)
+        close = np.zeros(len(prim_rows), dtype=bool)
+        for i in range(0, len(prim_rows), BATCH_SIZE):
+            batch = slice(i, i + BATCH_SIZE)
+            bound = (np.abs(self.counts[prim_rows[batch]] - counts[cust_rows[batch]]).sum(1) + 1) // 2
+            close[batch] = bound <= (1 - threshold) * longest[batch] + 1e-9
+        prim_rows, cust_rows, longest = prim_rows[close], cust_rows[close], longest[close]
+        logger.debug(f'Fuzzy name pairs scored: {len(prim_rows)}')
+
+        scores = np.empty(len(prim_rows))
+        for i in range(0, len(prim_rows), BATCH_SIZE):
+            batch = slice(i, i + BATCH_SIZE)
+            dist = levenshtein(self.codes[prim_rows[batch]], codes[cust_rows[batch]],
+                               self.lengths[prim_rows[batch]], lengths[cust_rows[batch]])
+            scores[batch] = 1 - dist / longest[batch]
+
+        keep = scores >= threshold
+        return pd.DataFrame({self.id_col: self.ids[prim_rows[keep]],
+                             key_col: df[key_col].to_numpy()[cust_rows[keep]],
+                             'Name Score': scores[keep].round(3)})
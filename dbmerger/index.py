@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+from os.path import exists, join, splitext
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# bump to invalidate all existing caches when the stored layout or cleaning rules change
+VERSION = 4
+
+
+class PrimaryIndex:
+    """Cleaned primary database, cached to disk as feather files
+
+    The cache is keyed by the content hash of the primary file and the settings used to clean it.
+    The main frame holds only the columns used for matching and exports, all columns are kept in a separate
+    memory-mapped frame so only the rows exported in full are loaded. Name and contact lookups are not cached, as
+    names are joined on the cleaned frame and contact values are only compared within the matched pairs."""
+
+    def __init__(self, main, copy, key=None, full=None):
+        self.main = main
+        self.copy = copy
+        self.key = key
+        self.full = full if full is not None else main
+
+    @staticmethod
+    def get_key(filepath, settings, block_size=2 ** 20):
+        """hash primary file contents together with the settings relevant to cleaning it"""
+        digest = hashlib.sha256()
+        with open(filepath, 'rb') as file:
+            for block in iter(lambda: file.read(block_size), b''):
+                digest.update(block)
+
+        settings = json.dumps({'version': VERSION, **settings}, sort_keys=True)
+        digest.update(settings.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get_rows(self, id_col, ids):
+        """get all columns of the primary rows with the given IDs, only converting these rows if memory-mapped"""
+        if isinstance(self.full, pd.DataFrame):
+            return self.full[self.full[id_col].isin(ids)]
+
+        mask = self.full.column(id_col).to_pandas().isin(ids).to_numpy()
+        return self.full.filter(pa.array(mask)).to_pandas().fillna(np.nan)
+
+    @staticmethod
+    def get_folder(cache_path, filename):
+        return join(cache_path, splitext(filename)[0])
+
+    def save(self, cache_path, filename):
+        """write index to feather files in the cache folder, replacing any previous index"""
+        folder = self.get_folder(cache_path, filename)
+        logger.debug(f'Saving primary index to {folder}')
+
+        if exists(folder):
+            shutil.rmtree(folder)
+        os.makedirs(folder)
+
+        frames = {'main': self.main, 'copy': self.copy, 'full': self.full}
+
+        try:
+            for name, df in frames.items():  # uncompressed so files can be memory-mapped on load
+                feather.write_feather(df.reset_index(drop=True), join(folder, f'{name}.feather'),
+                                      compression='uncompressed')
+        except (pa.ArrowInvalid, pa.ArrowTypeError, ValueError) as e:
+            logger.warning(f'Could not cache primary index, continuing without cache: {e}')
+            shutil.rmtree(folder)
+            return
+
+        # manifest written last, marking the cache as complete
+        with open(join(folder, 'manifest.json'), 'w') as file:
+            json.dump({'key': self.key, 'filename': filename, 'frames': list(frames)}, file, indent=2)
+
+        # release the full frame from memory in favour of the memory-mapped file
+        self.full = feather.read_table(join(folder, 'full.feather'), memory_map=True)
+
+    @classmethod
+    def load(cls, cache_path, filename, key):
+        """load index from cache folder if present and built from the same file and settings"""
+        folder = cls.get_folder(cache_path, filename)
+        manifest_path = join(folder, 'manifest.json')
+        if not exists(manifest_path):
+            logger.debug(f'No primary index found at {folder}')
+            return None
+
+        with open(manifest_path, 'r') as file:
+            manifest = json.load(file)
+
+        if manifest.get('key') != key:
+            logger.info('Primary database or settings changed, rebuilding primary index...')
+            return None
+
+        frames = {}
+        for name in manifest['frames']:
+            table = feather.read_table(join(folder, f'{name}.feather'), memory_map=True)
+            # arrow nulls load as None in object columns, restore NaN as used by the rest of the program
+            frames[name] = table if name == 'full' else table.to_pandas().fillna(np.nan)
+
+        return cls(frames['main'], frames['copy'], key, frames['full'])
@@ -0,0 +1,720 @@
+import json
+import logging
+import os
+import sys
+from inspect import cleandoc
+from itertools import chain
+from os.path import getsize, join, split, splitext
+from textwrap import dedent
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+import dbmerger.parallel as parallel
+import dbmerger.xlsx2csv as xlsx2csv
+from dbmerger.areas import AreaMatcher
+from dbmerger.contacts import get_status, match_pairs
+from dbmerger.data import Data
+from dbmerger.export import Export
+from dbmerger.spill import Spill
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+
+class Match(Data, Export):
+    """Import and merge databases"""
+
+    def __init__(self, settings):
+        Data.__init__(self, settings)
+        Export.__init__(self, settings)
+
+        # options
+        self.options = settings['options']
+
+        # columns names
+        self.prim_cols = settings['prim_cols']
+        self.prim_id = settings['id']
+        self.prim_areas = settings['areas']
+
+        self.cust_cols = settings['cust_cols']
+        self.cust_areas = settings['cust_areas']
+
+        # directories
+        self.check_path = settings['check']
+
+        # minimum similarity of names matched with option 'y', and the primary names index it uses
+        self.fuzzy_score = settings['fuzzy_score']
+        self.fuzzy = None
+
+        # number of customer files to process at once, and to load ahead of the file being matched
+        self.workers = settings['workers']
+        self.prefetch = settings['prefetch']
+
+        # customer files skipped or failed in this run
+        self.failed = []
+
+        # system specific open command
+        self.open = settings['open']
+
+        # create directories as needed
+        if not os.path.exists(self.check_path):
+            logging.debug(f'Creating check path at {self.check_path}')
+            os.makedirs(self.check_path)
+
+        logger.debug(f'========== Match object instantiated ==========\n{json.dumps(self.__dict__, indent=2, default=vars)}')
+
+    def get_matches(self, primary, cust, prim_main, cust_main):
+        """Match by name, iterate through each match condition, and generate separated dataframes"""
+        pairs = self.get_pairs(primary, cust, cust_main)
+        if pairs is None:
+            return None, None, None
+
+        return self.select_matches(*pairs, prim_main, cust_main)
+
+    def get_pairs(self, primary, cust, cust_main):
+        """Match by name and check each match condition for every matched pair
+
+        :return: matched pairs, boolean arrays for pairs with matching and with any contact data,
+            and whether any match condition was checked, or None if name columns not found"""
+        logger.info('========== Matching ==========')
+        print()
+
+        try:  # generate matches by name
+            logger.info('Matching by name... ')
+            time = perf_counter()
+            cust_name = [col for col in self.cust_cols['n'] if col in cust.columns]
+
+            if len(cust_name) == 0:
+                return None
+
+            with self.metrics.span('names') as span:
+                matches = pd.merge(primary, cust, left_on=self.prim_cols['n'], right_on=cust_name,
+                                   how='inner').drop(cust_name, axis=1).reset_index(drop=True)
+                span.set(rows=len(matches))
+            logger.info(f'Done: {round(perf_counter() - time, 5)}s')
+            print()
+        except KeyError:
+            return None
+
+        if self.fuzzy is not None:  # add pairs with similar names
+            matches = self.match_fuzzy(matches, primary, cust, cust_main, cust_name)
+
+        # status of each matched row, keyed by its position in matches
+        same_pairs = np.zeros(len(matches), dtype=bool)
+        present_pairs = np.zeros(len(matches), dtype=bool)
+        evaluated = False
+
+        # filter and drop column types not being used for matching
+        logger.debug('Filtering column dictionaries')
+        prim_cols = {k: list(set(v).intersection(set(primary.columns)))
+                     for k, v in self.prim_cols.copy().items() if k in self.options}
+        cust_cols = {k: list(set(v).intersection(set(cust.columns)))
+                     for k, v in self.cust_cols.copy().items() if k in self.options}
+
+        for (i, prim_col), (_, cust_col) in zip(prim_cols.items(), cust_cols.items()):
+            if i == 'n':  # skip over checking names
+                continue
+            text = {'p': 'Phone number', 'e': 'Email', 'f': 'Fax number'}
+
+            if len(cust_col) == 0:  # if columns not in customer df, skip
+                logger.warning(f'{text[i]} columns not found from customer database, skipping...')
+                continue
+
+            logger.debug(f'{text[i]} columns found: {cust_col}')
+
+            # join long-format contact values on (pair, value) for this column type
+            logger.info(f'Matching by {text[i].lower()}... (found {len(cust_col)} customer column/s)')
+            time_ = perf_counter()
+            with self.metrics.span(text[i].lower(), rows=len(matches)):
+                same, present = match_pairs(matches, prim_col, cust_col)
+            same_pairs |= same
+            present_pairs |= present
+            evaluated = True
+            logger.debug(f'Current matched pairs - same: {same_pairs.sum()}, present: {present_pairs.sum()}')
+            logger.info(f'Done matching all {text[i].lower()}s: {round(perf_counter() - time_, 5)}s\n')
+
+        return matches, same_pairs, present_pairs, evaluated
+
+    def match_fuzzy(self, matches, primary, cust, cust_main, cust_name):
+        """add pairs of similar names not already matched by identical names to the matched pairs"""
+        logger.info(f'Matching by similar names... (minimum score {self.fuzzy_score})')
+        time = perf_counter()
+
+        with self.metrics.span('fuzzy') as span:
+            cust_main = cust_main[cust_main['cust_index'].isin(cust['cust_index'])]
+            pairs = self.fuzzy.match(cust_main, cust_name, 'cust_index', self.fuzzy_score)
+            exact = pd.MultiIndex.from_frame(matches[[self.prim_id, 'cust_index']])
+            pairs = pairs[~pd.MultiIndex.from_frame(pairs[[self.prim_id, 'cust_index']]).isin(exact)]
+
+            # build pairs as for identical names, with the score of each name pair
+            fuzzy = pd.merge(primary, pairs, on=self.prim_id).merge(cust.drop(cust_name, axis=1), on='cust_index')
+            fuzzy = fuzzy.reindex(columns=[*matches.columns, 'Name Score'])
+
+            # most similar names first, then by primary row and customer row, so the pair kept for each ID doesn't
+            # depend on the order of the merge or on the chunks a customer database is streamed in
+            position = self.get_position(primary, fuzzy[self.prim_id])
+            fuzzy = fuzzy.iloc[np.lexsort((fuzzy['cust_index'].to_numpy(), position,
+                                           -fuzzy['Name Score'].to_numpy()))]
+            span.set(rows=len(fuzzy))
+
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s (found {len(fuzzy)} similar names)')
+        print()
+        return pd.concat([matches, fuzzy], ignore_index=True)
+
+    def get_position(self, primary, ids):
+        """row position in the primary dataframe of each primary ID"""
+        position = pd.Series(np.arange(len(primary)), index=primary[self.prim_id].to_numpy())
+        return ids.map(position[~position.index.duplicated()]).to_numpy()
+
+    def select_matches(self, matches, same_pairs, present_pairs, evaluated, prim_main, cust_main):
+        """Decide the status of each primary ID from its matched pairs and generate separated dataframes"""
+        # decide status for every pair in one pass and reduce to primary IDs
+        same_idx, diff_idx, none_idx = set(), set(), set()
+        if evaluated:
+            same_idx, diff_idx, none_idx = get_status(matches[self.prim_id], same_pairs, present_pairs)
+
+        # return filtered matches dataframes, keeping the pair which decided each ID's status
+        ids = matches[self.prim_id]
+        same = matches[same_pairs].drop_duplicates(subset=self.prim_id)
+        diff = matches[ids.isin(diff_idx) & present_pairs].drop_duplicates(subset=self.prim_id)
+        none = matches[ids.isin(none_idx)].drop_duplicates(subset=self.prim_id)
+
+        # filter out entries where customer data has already been matched
+        diff = diff[~diff['cust_index'].isin(same['cust_index'])]
+        none = none[~none['cust_index'].isin(same['cust_index'])]
+
+        # match uncertain matches by areas
+        with self.metrics.span('areas', rows=len(diff) + len(none)):
+            same, diff, none = self.match_areas(same, diff, none, matches, prim_main, cust_main)
+
+        logger.debug(f'Matches - same: {len(same)}, diff: {len(diff)}, none: {len(none)}')
+        logger.info('========== Matching Complete ==========\n')
+        if all(char not in self.options for char in ['x', 's']) or 'v' in self.options:
+            print('-' * 88, '\n')
+
+        return same, diff, none
+
+    def match_areas(self, same, diff, none, matches, prim_main, cust_main):
+        """match based on medical areas"""
+        start_lengths = [len(same), len(diff), len(none)]
+
+        # extract available columns
+        prim_cols = [col for col in self.prim_areas if col in prim_main.columns]
+        cust_cols = [col for col in self.cust_areas if col in cust_main.columns]
+        cust_df = cust_main[cust_cols].reset_index().rename(columns={'index': 'cust_index'}).fillna('')
+
+        if len(prim_cols) == 0:
+            logger.warning(f'No medical area columns found in primary database or areas.txt empty, skipping areas check...\n')
+            return same, diff, none
+
+        if len(cust_cols) == 0:
+            logger.warning(f'No medical area columns found in customer database or areas.txt empty, skipping areas check...\n')
+            return same, diff, none
+
+        logger.info(f'Checking medical areas for imperfect matches... (found {len(cust_cols)} customer column/s)')
+        logger.debug(f'Filtered medical area columns: {cust_cols}')
+        time = perf_counter()
+
+        logger.debug(cleandoc(f"""Start lengths -
+                     same: {start_lengths[0]},
+                     diff: {start_lengths[1]},
+                     none: {start_lengths[2]}""").replace('\s+', ' ').replace('\n', ''))
+
+        # encode primary one-hot columns and customer free text as bitmasks of areas
+        logger.debug('Encoding areas as bitmasks')
+        areas = AreaMatcher({col: self.prim_areas[col] for col in prim_cols})
+        prim_bits = areas.encode(prim_main)
+        cust_bits = areas.search(cust_main[cust_cols])
+        prim_areas = pd.DataFrame({self.prim_id: prim_main[self.prim_id].to_numpy(),
+                                   'Primary DF Areas': areas.names(prim_bits),
+                                   'prim_row': np.arange(len(prim_main))})
+        cust_df['cust_row'] = np.arange(len(cust_df))
+
+        # merge and reorder columns
+        logger.debug('Merging with diff / none')
+        diff = diff.merge(prim_areas, on=self.prim_id).merge(cust_df, on='cust_index')
+        none = none.merge(prim_areas, on=self.prim_id).merge(cust_df, on='cust_index')
+
+        # extract boolean matching for indexing all match cases
+        logger.debug('Matching areas')
+        diff_bool = areas.matches(prim_bits[diff.pop('prim_row').to_numpy(dtype=np.int64)],
+                                  cust_bits[diff.pop('cust_row').to_numpy(dtype=np.int64)])
+        none_bool = areas.matches(prim_bits[none.pop('prim_row').to_numpy(dtype=np.int64)],
+                                  cust_bits[none.pop('cust_row').to_numpy(dtype=np.int64)])
+
+        logging.debug('Building match dataframes for each case')
+        # add extra matching data for areas to the given matches
+        same = same.merge(prim_areas.drop(columns='prim_row'), on=self.prim_id)
+        same = same.merge(cust_df.drop(columns='cust_row'), on='cust_index')
+        # keep the pair which decided each ID's status, adding the pairs matched by areas, in order of matched IDs
+        same = pd.concat([same, diff[diff_bool], none[none_bool]], ignore_index=True)
+        order = pd.Index(matches[self.prim_id].drop_duplicates()).get_indexer(same[self.prim_id])
+        same = same.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+        # index remaining data for diff / none
+        diff = diff[~diff_bool]
+        none = none[~none_bool]
+
+        logger.debug(cleandoc(f"""Differences - 
+                     same: +{len(same) - start_lengths[0]}, 
+                     diff: {len(diff) - start_lengths[1]}, 
+                     none: {len(none) - start_lengths[2]}""").replace('\s+', ' ').replace('\n', ''))
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
+
+        return same, diff, none
+
+    def conflicts(self, filename, same, diff, none):
+        """Show conflicts to user and allow them to view more information"""
+
+        # concat dataframes
+        df = pd.concat([diff, none])
+        if len(df) == 0:  # skip if none
+            logger.debug(f'No conflicts, skipping conflicts function\n')
+            return df
+
+        if 'q' not in self.options:
+            logger.info('========== Resolve Conflicts ==========')
+            print()
+        else:
+            logger.debug('========== Resolve Conflicts ==========')
+
+        view = False
+
+        if 's' not in self.options:
+            # prompt to view more information
+            logger.info(f"Found {len(df)} conflicts")
+            print(dedent("""
+            How would you like to resolve these conflicts?
+            - x: export conflicts to check folder and delete rows you would like to remove
+            - v: view more information on conflicts in program and manually type in IDs to keep
+            """))
+            view = 'v' in input("Enter 'x' or 'v': ").lower().strip()
+            logger.debug(f'User input for view in console: {view}')
+
+            print('\n' + '-' * 88 + '\n')
+
+        # resolve conflicts
+        if 'q' in self.options:
+            if 'o' in self.options:
+                logger.info('Auto-mode enabled: only keeping perfect matches')
+                keep = []
+            else:
+                logger.info('Auto-mode enabled: automatically keeping all conflicts')
+                keep = set(df[self.prim_id])
+        elif view or ('v' in self.options and 's' in self.options):
+            conflicts = sorted(list(set(df[self.prim_id])))
+            self.view_conflicts(df, conflicts)
+            keep = self.resolve_conflicts_by_input(df, conflicts)
+            print()
+        else:  # resolve conflicts by spreadsheet
+            if 'x' not in self.options:
+                print()
+                self.options += ['x']
+                self.check(filename, same, diff, none)
+            keep = self.resolve_conflicts_by_check(filename)
+            print()
+
+        logger.info(f"======== Keeping {len(keep)} conflicting entries ========\n")
+
+        # filter dataframe
+        return df[df[self.prim_id].isin(keep)]
+
+    def view_conflicts(self, df, conflicts):
+        """view information on conflicts in program window"""
+        logger.debug('Resolving conflicts in console')
+
+        while True:
+            logger.debug('Prompting user for entries to view in console')
+            # show IDs with conflicts and prompt user for IDs to view
+            print(f"IDs with conflicts: ")
+            [print(conflicts[i:i + 15]) for i in range(0, len(conflicts), 15)]
+
+            print("\nEnter IDs you would like to check separated by a space")
+            print("---OR---")
+            print("Enter 'n' to stop viewing information\n""")
+
+            inp = input("(e.g. '2 8 24 849' or 'all') : ").lower().strip()
+            logger.debug(f'Input: {inp}')
+
+            if inp == 'n':  # break loop if user inputs 'n'
+                print('\n', '-' * 28, '\n', sep='')
+                break
+            elif inp == 'all':  # display all conflicts
+                inp = list(df[self.prim_id])
+
+            try:  # recast as integers
+                idx = [int(i) for i in inp.split(' ')]
+                logger.debug(f'Output: {idx}')
+            except ValueError:  # error if non-numbers entered
+                print()
+                logger.error('!!! ERROR: only enter numbers separated by spaces !!!\n')
+                continue
+            except AttributeError:  # return all indices
+                logger.debug('Attribute Error: returning all indices\n')
+                idx = inp
+
+            try:
+                logger.debug(f'Indices: {idx}')
+                logger.debug('Printing entries in console')
+                for i in idx:  # print series for each index
+                    print('\n', '-' * 28, '\n', sep='')
+                    print(df.set_index(self.prim_id).loc[i])
+            except KeyError:  # indices given not in conflicts
+                print()
+                logger.error('!!! ERROR: index not found, enter only numbers from the conflicts list !!!\n')
+                continue
+
+            print('\n', '-' * 28, '\n', sep='')
+
+    def resolve_conflicts_by_input(self, df, conflicts):
+        """get IDs to keep from user in program window"""
+        while True:
+            logger.debug(f'Prompting user for entries to keep')
+
+            # show IDs with conflicts and prompt user for IDs to keep
+            print(f"IDs with conflicts: ")
+            [print(conflicts[i:i + 15]) for i in range(0, len(conflicts), 15)]
+            print("\nEnter IDs you would like to keep")
+            inp = input("(e.g. '6 12 746' or 'all' or 'none') : ").lower().strip()
+            logger.debug(f'Input: {inp}')
+
+            if inp == 'all':  # keep all IDs
+                return list(df[self.prim_id])
+            elif inp == 'none':  # keep no IDs
+                return []
+            else:
+                try:  # recast as integers
+                    keep = [int(i) for i in inp.split(' ')]
+                    logger.debug(f'Output: {keep}')
+                    if set(keep).issubset(set(df[self.prim_id])):  # if all IDs given are conflict IDs
+                        logger.debug('All input entries successfully found')
+                        return keep
+                    else:  # retry
+                        print()
+                        logger.error('!!! ERROR: some IDs not found in conflict list !!!\n')
+                        print()
+                except ValueError:  # error if non-numbers entered
+                    print()
+                    logger.error('!!! ERROR: only enter numbers separated by spaces !!!\n')
+                    print()
+                    continue
+                except Exception as e:  # other errors
+                    logger.error(f'{e}\n')
+
+    def resolve_conflicts_by_check(self, filename):
+        """load IDs to keep from check spreadsheet"""
+        logger.debug(f'Resolving conflicts by check spreadsheet')
+        logger.debug(f'Filename: {filename}_check.xlsx')
+
+        check_name = join(self.check_path, f'{filename}_check.xlsx')  # full filepath
+
+        path = check_name
+        folders = []
+        while True:  # split filepath
+            path, folder = split(path)
+            if folder != "":
+                folders.append(folder)
+            elif path != "":
+                folders.append(path)
+                folders.reverse()
+                break
+
+        short_name = '/'.join(folders[-3:])  # shortened filepath for printing
+
+        # run system specific open command
+        logger.debug(f'Opening file for platform: {sys.platform}')
+        if sys.platform == "win32":
+            os.startfile(check_name)
+        else:
+            os.system(f'{self.open}{check_name}')
+
+        # wait for user to continue
+        print(cleandoc(f"""From your desktop, open {short_name}
+        Delete rows you don't want to keep from the 'Uncertain Match' and 'Missing Data' sheets
+        
+        !!! Remember to save the spreadsheet before continuing !!!"""), '\n')
+
+        input("Hit enter when you are ready to load from check file: ")
+
+        logger.debug('Loading entries from spreadsheet')
+
+        # extract remaining IDs
+        check_diff = list(pd.read_excel(check_name, sheet_name='Uncertain Match')[self.prim_id])
+        check_none = list(pd.read_excel(check_name, sheet_name='Missing Data')[self.prim_id])
+        logger.debug(f'Keeping - diff: {len(check_diff)}, none: {len(check_none)}')
+        return check_diff + check_none
+
+    def loop_customer_files(self):
+        """Loop through all customer excel sheets in input folder"""
+        # get filenames
+        prim_filename, cust_filenames = self.check_files()
+        if prim_filename is None:  # stop program if no files in input folder
+            logger.debug('prim_filename is None')
+            return False
+
+        # load and process primary df, using the cached primary index if unchanged
+        prim_name = splitext(prim_filename)[0]
+        with self.metrics.span('primary', file=prim_name):
+            index = self.get_primary(prim_filename)
+            prim_main, prim_copy = index.main, index.copy
+
+            if 'y' in self.options:  # index primary names once for all customer files
+                self.fuzzy = self.get_fuzzy(prim_main, prim_copy)
+        self.metrics.close(prim_name)
+
+        if self.workers > 1 and len(cust_filenames) > 1 and parallel.available():
+            # match in worker processes sharing the primary dataframes, exporting here unless in auto mode
+            logger.info(f'Processing {len(cust_filenames)} customer files with {self.workers} worker processes\n')
+            export = 'q' in self.options
+            for filename, processed, result in parallel.run(self, cust_filenames, index, self.workers, export):
+                if not processed:
+                    self.failed.append(filename)
+                elif result is not None and not export:
+                    try:
+                        self.export_file(*result, index)
+                    except Exception:  # isolate failures so one file doesn't stop the batch
+                        logger.exception(f'ERROR: Skipping {filename} - processing failed')
+                        self.failed.append(filename)
+            return True
+
+        if self.workers > 1:
+            logger.debug(f'Parallel processing not available on {sys.platform}, processing files in series')
+            if len(cust_filenames) > 1:  # still read excel files in worker processes ahead of matching them
+                self.read_ahead(cust_filenames, workers=self.workers)
+
+        # without user input, export in the background while the next file is matched
+        exports = parallel.ExportPool(self.export_file) if 'q' in self.options else None
+
+        # load and clean the next files while the current file is matched
+        files = parallel.prefetch(lambda name: self.get_df(name, kind='cust'), cust_filenames, self.prefetch,
+                                  self.memory_budget, lambda name: getsize(join(self.input_path, name)) / 2 ** 20,
+                                  self.use_chunks)
+
+        try:
+            for filename, loaded in files:  # loop through each customer df
+                try:
+                    result = self.match_file(filename, prim_main, prim_copy, loaded)
+                    if result is None:
+                        self.metrics.close(splitext(filename)[0])
+                        self.failed.append(filename)
+                        continue
+
+                    if exports is not None:
+                        exports.submit(*result, index)
+                    else:
+                        self.export_file(*result, index)
+                except Exception:  # isolate failures so one file doesn't stop the batch
+                    logger.exception(f'ERROR: Skipping {filename} - processing failed')
+                    self.metrics.close(splitext(filename)[0])
+                    self.failed.append(filename)
+        finally:
+            self.stop_reads()
+
+        if exports is not None:
+            failed = exports.join()
+            if len(failed) > 0:
+                logger.error(f'ERROR: {len(failed)} export/s failed: {", ".join(failed)}\n')
+                self.failed += failed
+
+        return True
+
+    def match_file(self, filename, prim_main, prim_copy, loaded=None):
+        """load a customer database and match it against the primary database
+
+        :param loaded: future of the customer dataframes if loaded ahead, loaded here if None
+        :return: export filename, customer dataframe, and match dataframes, or None if file skipped"""
+        logger.info('=' * 88)
+        logger.info(f'BEGIN PROCESSING: {filename}')
+        logger.info('=' * 88 + '\n')
+        name = splitext(filename)[0]  # filename for export, and the name its stages are timed under
+
+        if self.use_chunks(filename):  # stream databases larger than the memory budget
+            with self.metrics.span('match', file=name, chunks=True):
+                return self.match_chunks(filename, prim_main, prim_copy)
+
+        try:  # load customer df, waiting for it if loaded ahead
+            if loaded is None:
+                cust_main, cust_copy = self.get_df(filename, kind='cust')
+            else:
+                with self.metrics.span('wait', file=name):
+                    cust_main, cust_copy = loaded.result()
+        except KeyError:  # skip if given column names not found in df
+            logger.error(f'ERROR: Skipping {filename} - columns not found')
+            print('Change column names in customer database to match program settings')
+            print('or run the program again with different column name settings\n')
+            return None
+        except xlsx2csv.XlsxException as e:  # skip unreadable excel files
+            logger.error(f'ERROR: Skipping {filename} - could not read Excel file: {e}')
+            return None
+
+        logger.debug(f'Running matches for {name}')
+
+        # get matches
+        with self.metrics.span('match', file=name) as span:
+            same, diff, none = self.get_matches(prim_copy, cust_copy, prim_main, cust_main)
+            if same is not None:
+                span.set(same=len(same), diff=len(diff), none=len(none))
+        if same is None:
+            logger.error(f'ERROR: Skipping {filename} - columns not found')
+            print('Change column names in customer database to match program settings')
+            print('or run the program again with different column name settings\n')
+            return None
+
+        return name, cust_main, same, diff, none
+
+    def match_chunks(self, filename, prim_main, prim_copy):
+        """match a customer database chunk by chunk, spilling each chunk's matched pairs to disk
+
+        :return: export filename, matched customer rows, and match dataframes, or None if file skipped"""
+        spill = Spill(join(self.cache_path, 'spill', splitext(filename)[0]))
+
+        # duplicates are dropped across all chunks once matched, as a row's duplicate may be in another chunk
+        dedupe = 'd' in self.options
+        dupe_cols = ['cust_index', *chain(*[v for k, v in self.cust_cols.items() if k in ['p', 'e', 'f']])]
+
+        pairs, chunks, evaluated = None, 0, False
+        try:
+            for cust_main, cust_copy in self.get_chunks(filename, dedupe=not dedupe):
+                chunks += 1
+                pairs = self.get_pairs(prim_copy, cust_copy, cust_main)
+                if pairs is None:
+                    break
+
+                # only customer rows which matched are needed for matching areas and the exports
+                matches, same_pairs, present_pairs, chunk_evaluated = pairs
+                evaluated |= chunk_evaluated
+                spill.append(matches=matches, cust=cust_main[cust_main['cust_index'].isin(matches['cust_index'])],
+                             status=pd.DataFrame({'same': same_pairs, 'present': present_pairs}))
+                if dedupe:  # cleaned contact data of all rows
+                    spill.append(copy=cust_copy[[col for col in cust_copy.columns if col in dupe_cols]])
+        except Exception:
+            spill.remove()
+            raise
+
+        if chunks == 0:  # skip file
+            spill.remove()
+            logger.error(f'ERROR: Skipping {filename} - no rows found')
+            return None
+
+        if pairs is None:  # skip file
+            spill.remove()
+            logger.error(f'ERROR: Skipping {filename} - columns not found')
+            print('Change column names in customer database to match program settings')
+            print('or run the program again with different column name settings\n')
+            return None
+
+        logger.info('Loading matched pairs from all chunks... ')
+        time = perf_counter()
+        matches, cust_main, status = spill.load('matches'), spill.load('cust'), spill.load('status')
+
+        if dedupe:  # drop pairs of customer rows duplicating any other row, as when loaded in full
+            with self.metrics.span('dedup') as span:
+                copy = spill.load('copy')
+                cols = {k: list(set(v).intersection(set(copy.columns))) for k, v in self.cust_cols.items()}
+                kept = self.drop_dupes(copy, cols)['cust_index']
+                span.set(rows=len(kept))
+            keep = matches['cust_index'].isin(kept).to_numpy()
+            matches, status = matches[keep].reset_index(drop=True), status[keep].reset_index(drop=True)
+            cust_main = cust_main[cust_main['cust_index'].isin(kept)]
+        spill.remove()
+
+        # restore the order of pairs from loading in full, where pairs of identical names come before similar names,
+        # grouped by name in order of first appearance in the primary database, then by primary row and customer row,
+        # and similar names are ordered by score, then by primary row and customer row
+        names = prim_copy.groupby(self.prim_cols['n'], sort=False).ngroup().to_numpy()
+        rank = np.empty(len(prim_copy), dtype=np.int64)
+        rank[np.lexsort((np.arange(len(prim_copy)), names))] = np.arange(len(prim_copy))
+        rank = pd.Series(rank, index=prim_copy[self.prim_id].to_numpy())
+        order = matches[self.prim_id].map(rank[~rank.index.duplicated()]).to_numpy()
+        score = matches['Name Score'] if 'Name Score' in matches.columns else pd.Series(np.nan, matches.index)
+        fuzzy = score.notna().to_numpy()
+        order = np.where(fuzzy, self.get_position(prim_copy, matches[self.prim_id]), order)
+        order = np.lexsort((matches['cust_index'].to_numpy(), order, -score.fillna(0).to_numpy(), fuzzy))
+        matches, status = matches.iloc[order].reset_index(drop=True), status.iloc[order]
+
+        # index customer rows by cust_index as when loaded in full
+        cust_main.index = cust_main['cust_index'].to_numpy()
+        logger.debug(f'Matched pairs: {len(matches)}  -  Matched customer rows: {len(cust_main)}')
+        logger.info(f'Done: {round(perf_counter() - time, 5)}s\n')
+
+        # decide status across all chunks at once, so results match loading the database in full
+        same, diff, none = self.select_matches(matches, status['same'].to_numpy(), status['present'].to_numpy(),
+                                               evaluated, prim_main, cust_main)
+
+        return splitext(filename)[0], cust_main, same, diff, none
+
+    def export_file(self, filename, cust_main, same, diff, none, index):
+        """resolve conflicts for one customer database's matches and run final exports, then write the timings of
+        all stages for the file"""
+        try:
+            with self.metrics.span('export', file=filename):
+                self.export_matches(filename, cust_main, same, diff, none, index)
+        finally:
+            self.metrics.close(filename)
+
+    def export_matches(self, filename, cust_main, same, diff, none, index):
+        """resolve conflicts for one customer database's matches and run final exports"""
+        sheets = self.get_sheets(filename, cust_main, same, diff, none, index)
+        if sheets is None:
+            return
+
+        with self.metrics.span('save', formats=', '.join(self.export_format)):
+            self.save(filename, sheets)
+
+        logger.info('========== Final Exports Complete ==========\n')
+
+    def get_sheets(self, filename, cust_main, same, diff, none, index, full=False):
+        """resolve conflicts for one customer database's matches and collect the sheets of its final export
+
+        :param full: customer dataframe has all columns, otherwise they are loaded from the file for the exported rows
+        :return: dict of sheet names to dataframes, or None if no matches kept"""
+        prim_main = index.main
+
+        # export 3 matching conditions to excel sheet
+        if 'x' in self.options:
+            self.check(filename, same, diff, none)
+
+        # resolve conflicts, including time waiting for user input
+        with self.metrics.span('conflicts', rows=len(diff) + len(none)) as span:
+            keep = self.conflicts(filename, same, diff, none)
+            span.set(kept=len(keep))
+
+        # concat all matches
+        final_matches = pd.concat([same, keep])
+
+        if len(final_matches) == 0:
+            logger.info(f'No Matches Found: Skipping final export and continuing to next file\n')
+            return None
+
+        logger.debug('========== Final Exports ==========')
+        # load all columns only for the rows exported, and customer columns only if all are exported
+        with self.metrics.span('final', rows=len(final_matches)):
+            prim_rows = index.get_rows(self.prim_id, final_matches[self.prim_id])
+            if any(char in self.options for char in ['c', 'a']) and 'm' not in self.options and not full:
+                cust_rows = self.get_rows(self.get_filename(filename), final_matches['cust_index'])
+            else:
+                cust_rows = cust_main
+
+            # collect all sheets of the final export, saved once at the end
+            sheets = self.final(final_matches, prim_rows, cust_rows)
+
+        # add mailing list
+        if 'l' in self.options:
+            with self.metrics.span('mail', kind='perfect', rows=len(final_matches)):
+                sheets.update(self.mail(final_matches, prim_main, cust_main, kind='perfect'))
+
+        # add uncertain mailing lists
+        if 'u' in self.options:
+            check_name = join(self.check_path, f'{filename}_check.xlsx')  # full filepath
+            diff = pd.read_excel(check_name, sheet_name='Uncertain Match')
+            none = pd.read_excel(check_name, sheet_name='Missing Data')
+            conflict_matches = pd.concat([diff, none])
+            logger.debug(f'Processing {len(conflict_matches)} conflicting matches for mailing list')
+            with self.metrics.span('mail', kind='uncertain', rows=len(conflict_matches)):
+                sheets.update(self.mail(conflict_matches, prim_main, cust_main, kind='uncertain'))
+
+        return sheets
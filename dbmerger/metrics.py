@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from time import perf_counter, thread_time, time
+
+try:  # peak memory is only reported where available, not on windows
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# guards the file trees and the metrics file, as files are loaded and exported in background threads
+_lock = threading.Lock()
+
+
+def peak_memory():
+    """highest memory used by this process so far in MB, or None if not available"""
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10  # bytes on macOS, KB on linux
+
+
+class Span:
+    """One timed stage of a run, with the stages timed within it as children"""
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.children = []
+        self.thread = threading.current_thread().name
+
+        self.start = time()
+        self.wall = None
+        self.cpu = None
+        self.peak = None
+        self._wall = perf_counter()
+        self._cpu = thread_time()
+
+    def set(self, **fields):
+        """record extra fields of the stage, e.g. its number of rows"""
+        self.fields.update(fields)
+
+    def end(self, cpu=None):
+        """stop timing the stage
+
+        :param cpu: cpu time of the stage, measured in the thread which started it if None"""
+        self.wall = perf_counter() - self._wall
+        self.cpu = thread_time() - self._cpu if cpu is None else cpu
+        self.peak = peak_memory()
+
+    def to_dict(self):
+        """stage and its children as json serialisable values, times in seconds and peak memory in MB"""
+        return {'name': self.name, **self.fields, 'thread': self.thread, 'start': round(self.start, 3),
+                'wall': round(self.wall, 5), 'cpu': round(self.cpu, 5),
+                'peak_mb': None if self.peak is None else round(self.peak, 1),
+                'children': [child.to_dict() for child in self.children]}
+
+
+class Metrics:
+    """Timings of each stage of a run, as a tree of spans for each file written as json lines
+
+    Spans opened within another span in the same thread are its children. Spans opened outside any other span with a
+    file are children of that file's tree, so stages run in background threads, e.g. loading ahead or exporting, are
+    still part of the tree of the file they are for. Each file's tree is written as one line when the file is closed."""
+
+    def __init__(self, filepath=None):
+        """:param filepath: json lines file the trees are appended to, not written if None"""
+        self.filepath = filepath
+        self.files = {}
+        self.local = threading.local()
+
+    def stack(self):
+        """spans open in the current thread"""
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name, file=None, **fields):
+        """time a stage, yielding its span to record extra fields
+
+        :param file: name without extension of the file the stage belongs to, as exports only know the name, if not
+            opened within another span, else written as its own tree"""
+        stack = self.stack()
+        span = Span(name, **fields)
+        if len(stack) > 0:
+            stack[-1].children.append(span)
+        elif file is not None:
+            with _lock:
+                root = self.files.setdefault(file, Span('file', file=file))
+                root.children.append(span)
+
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:  # record failed stages before passing the error on
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end()
+            stack.pop()
+
+        if len(stack) == 0 and file is None:
+            self.write(span)
+
+    def close(self, file):
+        """finish the tree of a file once all its stages are done and write it
+
+        :param file: name of the file without extension, as given to its spans"""
+        with _lock:
+            root = self.files.pop(file, None)
+        if root is None:
+            return
+
+        # stages of a file may run in different threads, so its cpu time is the total of its stages
+        root.end(cpu=sum(child.cpu for child in root.children))
+        self.write(root)
+
+    def write(self, span):
+        """append a tree of spans to the metrics file as one line"""
+        if self.filepath is None:
+            return
+
+        line = json.dumps({'pid': os.getpid(), **span.to_dict()}, ensure_ascii=False, default=str)
+        with _lock, open(self.filepath, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
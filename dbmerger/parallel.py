@@ -0,0 +1,188 @@
+import logging
+import multiprocessing as mp
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count
+from os.path import basename, splitext
+from threading import BoundedSemaphore, Lock
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# background export threads, and exports queued or running at once before matching waits for one to finish
+EXPORT_THREADS = 1
+EXPORT_PENDING = 2
+
+# state set before the pool is forked so workers inherit it copy-on-write rather than unpickling it per task
+_shared = {}
+
+
+def available():
+    """workers share the primary dataframes by forking, so only platforms supporting fork can run in parallel"""
+    return sys.platform != 'win32' and 'fork' in mp.get_all_start_methods()
+
+
+def _worker(filename):
+    """match one customer file, and run its exports if non-interactive
+
+    :return: filename, whether it was processed rather than skipped or failed, and its match result if not exported"""
+    match = _shared['match']
+    try:
+        index = _shared['index']
+        result = match.match_file(filename, index.main, index.copy)
+        if result is None or not _shared['export']:
+            return filename, result is not None, result
+
+        match.export_file(*result, index)
+        return filename, True, None
+    except Exception:  # isolate failures so one file doesn't stop the batch
+        logger.exception(f'ERROR: Skipping {filename} - processing failed')
+        return filename, False, None
+    finally:  # timings of exports run by the main process are written there as a separate tree
+        match.metrics.close(splitext(filename)[0])
+
+
+def run(match, filenames, index, workers, export=False):
+    """process customer files in a pool of forked worker processes sharing the read-only primary dataframes
+
+    :param match: Match object used by each worker
+    :param index: primary index with the dataframes shared by all workers
+    :param export: resolve conflicts and export within the workers, only safe without user input
+    :return: generator of each file as it completes, with whether it was processed and its match result, None for
+             skipped or exported files"""
+    _shared.update(match=match, index=index, export=export)
+
+    try:
+        with mp.get_context('fork').Pool(min(workers, len(filenames))) as pool:
+            yield from pool.imap_unordered(_worker, filenames)
+    finally:
+        _shared.clear()
+
+
+class ExportPool:
+    """Exports of matched customer files run in background threads while the next file is loaded and matched
+
+    Only safe without user input. Submitting blocks while the maximum number of exports are queued or running, so the
+    matches held in memory for export stay bounded."""
+
+    def __init__(self, export, threads=EXPORT_THREADS, pending=EXPORT_PENDING):
+        """:param export: function run for each export, taking the export filename first"""
+        self.export = export
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='export')
+        self.slots = BoundedSemaphore(pending)
+        self.futures = {}
+
+    def submit(self, filename, *args):
+        """queue an export, waiting for a running export to finish if the queue is full"""
+        self.slots.acquire()
+        logger.debug(f'Queueing export of {filename}')
+        future = self.executor.submit(self.export, filename, *args)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.futures[future] = filename
+
+    def join(self):
+        """wait for all queued exports to finish
+
+        :return: filenames of failed exports"""
+        failed = []
+        for future, filename in self.futures.items():
+            try:
+                future.result()
+            except Exception:  # report failures once all exports are done, as other files may still succeed
+                logger.exception(f'ERROR: Export failed for {filename}')
+                failed.append(filename)
+
+        self.executor.shutdown()
+        self.futures.clear()
+        return failed
+
+
+class ReadPool:
+    """Files read in worker processes ahead of being loaded, for reads bound by the interpreter such as Excel sheets
+    on platforms where customer files can't be processed in forked workers
+
+    Reads start in the given order as earlier results are taken, so at most one result per worker process is held in
+    memory until loaded. Worker processes may be spawned rather than forked, so the read function must be defined at
+    module level."""
+
+    def __init__(self, read, jobs, workers):
+        """:param read: function reading a file, taking the filepath first
+        :param jobs: arguments of each read, in the order files are loaded"""
+        self.read = read
+        self.waiting = deque(jobs)
+        self.total = len(self.waiting)
+        self.done = count(1)
+        self.workers = min(workers, self.total)
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.futures = {}
+        self.lock = Lock()  # files may be loaded by the prefetch thread and the main thread at once
+        self.fill()
+
+    def fill(self):
+        """start reading the next files while fewer reads are running or waiting to be taken than worker processes"""
+        while len(self.waiting) > 0 and len(self.futures) < self.workers:
+            args = self.waiting.popleft()
+            future = self.executor.submit(self.read, *args)
+            future.add_done_callback(lambda future, filepath=args[0]: self.log(filepath, future))
+            self.futures[args[0]] = args, future
+
+    def log(self, filepath, future):
+        """log progress of reading a file, failures are reported when the file is loaded"""
+        i = next(self.done)
+        if future.cancelled() or future.exception() is not None:
+            logger.debug(f'[{i}/{self.total}] Could not read {basename(filepath)}')
+        else:
+            logger.info(f'[{i}/{self.total}] Read {basename(filepath)}')
+
+    def get(self, *args):
+        """take the read of a file started with the same arguments, and start reading the next file
+
+        :return: future of the read, or None if not read here"""
+        with self.lock:
+            args_, future = self.futures.pop(args[0], (None, None))
+            if args_ != args:  # read differently, e.g. with other columns, or not started yet
+                self.waiting = deque(job for job in self.waiting if job[0] != args[0])
+                future = None
+            self.fill()
+        return future
+
+    def close(self):
+        """stop reads not taken and shut down the worker processes"""
+        for _, future in self.futures.values():
+            future.cancel()
+        self.executor.shutdown()
+        self.futures.clear()
+
+
+def prefetch(load, filenames, depth=1, budget=0, size=None, skip=None):
+    """load files in a background thread ahead of the file being processed
+
+    :param load: function loading a file from its filename
+    :param depth: maximum number of files loaded ahead, 0 to load none ahead
+    :param budget: maximum total size in MB of files loaded ahead, 0 for no limit
+    :param size: function returning the size of a file in MB, e.g. on disk, used with a budget
+    :param skip: function checking if a file should not be loaded ahead, e.g. if streamed in chunks instead
+    :return: generator of each filename with a future of its loaded data, None if not loaded ahead"""
+    futures = {}
+    waiting = deque(filenames)
+    with ThreadPoolExecutor(1, thread_name_prefix='prefetch') as executor:
+        while len(waiting) > 0:
+            filename = waiting.popleft()
+            future = futures.pop(filename, None)
+
+            # load the next files while this one is processed, as far as the depth and memory budget allow
+            ahead = [name for name in list(waiting)[:depth] if skip is None or not skip(name)]
+            for name in ahead:
+                if name in futures:
+                    continue
+                if budget > 0 and sum(size(other) for other in futures) + size(name) > budget:
+                    break
+
+                logger.debug(f'Loading {name} ahead')
+                futures[name] = executor.submit(load, name)
+
+            yield filename, future
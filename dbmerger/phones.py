@@ -0,0 +1,70 @@
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+
+class PrefixTable:
+    """Lookup of prefixes by their length, finding the first listed prefix each value starts with"""
+
+    def __init__(self, prefixes):
+        self.prefixes = list(prefixes)
+
+        # position of each prefix in the list, grouped by length, keeping the first of repeated prefixes
+        self.tables = {}
+        for i, prefix in enumerate(self.prefixes):
+            self.tables.setdefault(len(prefix), {}).setdefault(prefix, i)
+
+    def match(self, values):
+        """position of the first listed prefix each value starts with
+
+        :param values: series of strings
+        :return: array of prefix positions, len(prefixes) where no prefix found"""
+        found = np.full(len(values), len(self.prefixes), dtype=np.int64)
+        for length, table in self.tables.items():
+            # a shorter value can't start with a prefix of this length, as its slice matches no prefix
+            position = values.str[:length].map(table).fillna(len(self.prefixes)).to_numpy(dtype=np.int64)
+            found = np.minimum(found, position)
+        return found
+
+    def lengths(self, found):
+        """length of each found prefix, 0 where no prefix found"""
+        return np.array([*map(len, self.prefixes), 0], dtype=np.int64)[found]
+
+
+class PhoneNormaliser:
+    """Phone numbers cleaned to digits, with the prefixes to drop and to sort by from the settings looked up for whole
+    columns at once"""
+
+    def __init__(self, drop=(), sort=()):
+        """:param drop: prefixes dropped before matching, e.g. local area codes
+        :param sort: prefixes ranked first in mailing lists, in order"""
+        self.drop = PrefixTable(drop)
+        self.sort = PrefixTable(sort)
+
+    def normalise(self, col):
+        """clean a column of phone numbers
+
+        :return: digits, digits without any drop prefix, and sort rank of each number, starting at 1 for the first
+                 sort prefix and len(sort) + 1 for numbers without one"""
+        if pd.api.types.is_numeric_dtype(col):  # numbers or empty columns read as floats
+            col = col.map('{:.0f}'.format, na_action='ignore').astype(object)
+
+        digits = col.str.replace(r'[^0-9]+', '', regex=True)
+        filled = digits.fillna('')
+
+        # strip the first listed drop prefix, slicing numbers with prefixes of the same length together
+        truncated = digits.copy()
+        lengths = self.drop.lengths(self.drop.match(filled))
+        for length in np.unique(lengths[lengths > 0]):
+            truncated[lengths == length] = digits[lengths == length].str[length:]
+
+        rank = self.sort.match(filled) + 1
+        return digits, truncated, rank
@@ -0,0 +1,101 @@
+import logging
+import sys
+from os.path import exists, join, splitext
+
+from dbmerger.match import Match
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+
+class Pipeline:
+    """Match customer dataframes held in memory against a primary database loaded once, e.g. to serve many small
+    uploads from a long running service
+
+    Always runs in auto mode, resolving conflicts by the settings without any user input. The primary database is
+    loaded on the first match if not loaded before, and only loaded again when load is called."""
+
+    def __init__(self, settings, primary=None):
+        """:param settings: settings as given by Settings.get_all
+        :param primary: filename of the primary database in the input folder, the one named in the settings if None"""
+        settings = {**settings, 'options': list({*settings['options'], 'q', 's'})}
+        self.matcher = Match(settings)
+        self.primary = primary or self.matcher.get_filename(splitext(self.matcher.prim_filename)[0])
+        self.index = None
+
+    def load(self):
+        """load and clean the primary database, from the index cache if unchanged, and index its names for matching
+        similar names if enabled"""
+        if not exists(join(self.matcher.input_path, self.primary)):
+            raise FileNotFoundError(f'Primary database {self.primary} not found in {self.matcher.input_path}')
+
+        name = splitext(self.primary)[0]
+        with self.matcher.metrics.span('primary', file=name):
+            index = self.matcher.get_primary(self.primary)
+            if 'y' in self.matcher.options:
+                self.matcher.fuzzy = self.matcher.get_fuzzy(index.main, index.copy)
+        self.matcher.metrics.close(name)
+
+        self.primary = self.matcher.get_filename(name)  # excel files may be saved as csv while loaded
+        self.index = index
+        return index
+
+    def get_index(self):
+        """primary index, loading it if not loaded yet"""
+        return self.load() if self.index is None else self.index
+
+    def process(self, filename):
+        """match a customer database in the input folder against the primary database and run its final exports
+
+        :return: whether the file was processed rather than skipped"""
+        index = self.get_index()
+        result = self.matcher.match_file(filename, index.main, index.copy)
+        if result is None:
+            self.matcher.metrics.close(splitext(filename)[0])
+            return False
+
+        self.matcher.export_file(*result, index)
+        return True
+
+    @staticmethod
+    def get_main(df):
+        """customer dataframe numbered by row as when loaded from the input folder, dropping empty rows"""
+        return df.reset_index(drop=True).dropna(how='all').reset_index().rename({'index': 'cust_index'}, axis=1)
+
+    def match(self, df):
+        """match a customer dataframe against the primary database
+
+        :param df: customer database with the column names given in the settings
+        :return: same, diff and none match dataframes"""
+        index = self.get_index()
+        with self.matcher.metrics.span('match', rows=len(df)) as span:
+            cust_main = self.get_main(df)
+            cust_copy = self.matcher.clean_df(cust_main, 'cust')
+            same, diff, none = self.matcher.get_matches(index.copy, cust_copy, index.main, cust_main)
+            if same is None:
+                raise KeyError('Name columns given in the settings not found in customer dataframe')
+            span.set(same=len(same), diff=len(diff), none=len(none))
+
+        return same, diff, none
+
+    def get_sheets(self, name, df, same, diff, none):
+        """resolve conflicts and collect the sheets of the final export of a customer dataframe's matches
+
+        :param name: name of the customer database, used for its check file if enabled
+        :return: dict of sheet names to dataframes, or None if no matches kept"""
+        return self.matcher.get_sheets(name, self.get_main(df), same, diff, none, self.get_index(), full=True)
+
+    def export(self, name, df, same, diff, none):
+        """write the final export of a customer dataframe's matches to the final folder in each export format
+
+        :param name: name of the customer database, exported as {name}_final
+        :return: dict of sheet names to dataframes written, or None if no matches kept"""
+        with self.matcher.metrics.span('export', rows=len(df)):
+            sheets = self.get_sheets(name, df, same, diff, none)
+            if sheets is not None:
+                self.matcher.save(name, sheets)
+
+        return sheets
@@ -6,7 +6,8 @@ import shutil
 import sys
 from inspect import cleandoc
 from itertools import chain
-from os.path import expanduser, join
+from multiprocessing import cpu_count
+from os.path import abspath, dirname, expanduser, isfile, join
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -14,16 +15,24 @@ stdout_handler = logging.StreamHandler(stream=sys.stdout)
 stdout_handler.setLevel(logging.INFO)
 logger.addHandler(stdout_handler)
 
+# formats the final export can be saved as
+FORMATS = ['xlsx', 'parquet', 'csv']
+
 
 class Settings:
     """Get user input to set custom settings and columns names"""
 
-    def __init__(self):
+    def __init__(self, filepath='settings.txt', interactive=True):
+        """:param filepath: settings file, with the areas.txt file read from the same folder
+        :param interactive: prompt the user to fix or change settings, otherwise run in auto mode without any input"""
+        self.filepath = filepath
+        self.interactive = interactive
+
         # if settings file doesn't exist, restore from backup
-        if not os.path.isfile('settings.txt'):
+        if not os.path.isfile(self.filepath):
             logger.warning('Settings file not found. Restoring from default.')
             print()
-            shutil.copyfile('settings.bak', 'settings.txt')
+            shutil.copyfile(self.get_backup(self.filepath), self.filepath)
 
         # system specific settings/commands
         if sys.platform == "linux":
@@ -41,18 +50,28 @@ class Settings:
             try:
                 self.all_settings = self.load_settings()
                 break
-            except KeyError:
-                logger.error("ERROR: Settings file keys not recognised. Inspect settings.txt to fix.")
-                print("Would you like to delete settings.txt and restore from default settings backup?")
+            except (KeyError, ValueError) as e:
+                if isinstance(e, KeyError):
+                    logger.error(f"ERROR: Settings file keys not recognised. Inspect {self.filepath} to fix.")
+                else:
+                    logger.error(f"ERROR: {e}. Inspect {self.filepath} to fix.")
+                if not self.interactive:
+                    raise
+
+                print(f"Would you like to delete {self.filepath} and restore from default settings backup?")
                 change = 'y' in input("(type 'y' (yes) or 'n' (no)) : ").lower().strip()
                 print()
                 if change:
-                    shutil.copyfile('settings.bak', 'settings.txt')
+                    shutil.copyfile(self.get_backup(self.filepath), self.filepath)
                     print('-' * 88, '\n')
 
         # system specific open command
         self.all_settings['open'] = self.open
 
+        # without user input, run in auto mode which also skips all settings checks
+        if not self.interactive:
+            self.all_settings['options'] = list({*self.all_settings['options'], 'q', 's'})
+
         # assign settings to self to reduce coding clutter
         self.options = self.all_settings['options']
         if 'n' not in self.options:
@@ -68,12 +87,32 @@ class Settings:
 
         logger.debug(f'========== Settings object instantiated ==========\n{json.dumps(self.__dict__, indent=2)}')
 
+    @staticmethod
+    def get_backup(filepath):
+        """default settings backup next to the settings file, or next to the program if not found there"""
+        backup = join(dirname(abspath(filepath)), 'settings.bak')
+        if isfile(backup):
+            return backup
+
+        program = dirname(sys.executable) if getattr(sys, 'frozen', False) else dirname(dirname(abspath(__file__)))
+        return join(program, 'settings.bak')
+
+    @staticmethod
+    def get_number(all_settings, key, default, kind=int):
+        """numeric setting, raising a readable error naming the setting if not a number"""
+        value = all_settings.get(key, default)
+        try:
+            return kind(value)
+        except ValueError:
+            name = key.replace('_', ' ').title()
+            raise ValueError(f"Setting '{name}' must be a {'whole ' if kind is int else ''}number, not '{value}'") from None
+
     def load_settings(self):
-        """load settings from settings.txt file in program directory"""
-        logger.debug('Loading settings from settings.txt')
+        """load settings from settings.txt file in program directory, or the settings file given"""
+        logger.debug(f'Loading settings from {self.filepath}')
 
         strings = []  # store settings strings
-        with open('settings.txt', 'r') as file:
+        with open(self.filepath, 'r') as file:
             for line in file:  # check if line is options line
                 if line[0] != '#' and len(line.strip().split(':')) > 1:
                     line = line.split(':')
@@ -118,12 +157,31 @@ class Settings:
         # directories
         folder = join(self.folder, re.sub(r'[\\/*?:"<>|]', "", all_settings['folder_name']))
         paths = {k: join(folder, v.replace("'", '')).replace(' ', '_')
-                 for k, v in all_settings.items() if k in ['input', 'check', 'final']}
+                 for k, v in all_settings.items() if k in ['input', 'check', 'final', 'cache']}
         prim_filename = re.sub(r'[\\/*?:"<>|]', '', all_settings['primary_data'])
 
+        # formats of the final export, excel unless other known formats are given
+        export_format = [v.strip().lower() for v in all_settings.get('export_format', 'xlsx').split(',')]
+        if any(kind not in FORMATS for kind in export_format):
+            logger.warning(f'Unknown export formats ignored: {[kind for kind in export_format if kind not in FORMATS]}')
+        export_format = [kind for kind in FORMATS if kind in export_format] or ['xlsx']
+
+        # excel files are read directly, also saving them as csv if enabled
+        excel_csv = 'y' in all_settings.get('excel_csv', 'no').lower()
+
+        # performance, 0 workers uses all available cores, memory budget in MB with 0 for no limit, number of files
+        # loaded ahead, and excel exports streamed to disk if enabled
+        workers = self.get_number(all_settings, 'workers', 1) or cpu_count()
+        memory_budget = self.get_number(all_settings, 'memory_budget', 0)
+        prefetch = self.get_number(all_settings, 'prefetch', 1)
+        streaming_export = 'y' in all_settings.get('streaming_export', 'no').lower()
+
+        # fuzzy name matching
+        fuzzy_score = self.get_number(all_settings, 'fuzzy_score', 0.85, float)
+
         # load field column translations
         strings = []  # store strings
-        with open('areas.txt', 'r') as file:
+        with open(join(dirname(self.filepath), 'areas.txt'), 'r') as file:
             for line in file:  # check if line is options line
                 if line[0] != '#' and len(line.strip().split(':')) > 1:
                     line = line.split(':')
@@ -151,11 +209,19 @@ class Settings:
             'phone_sort': phone_sort,
             'phone_drop': phone_drop,
             'title_drop': title_drop,
+            'fuzzy_score': fuzzy_score,
             'folder': folder.replace(' ', '_'),
             'input': paths['input'],
             'check': paths['check'],
             'final': paths['final'],
+            'cache': paths.get('cache', join(folder, 'cache').replace(' ', '_')),
             'prim_filename': prim_filename,
+            'export_format': export_format,
+            'excel_csv': excel_csv,
+            'workers': workers,
+            'memory_budget': memory_budget,
+            'prefetch': prefetch,
+            'streaming_export': streaming_export,
 
         }
 
@@ -168,7 +234,7 @@ class Settings:
 
         # define option strings for printing
         match_dict = {'n': '' if any(char in self.options for char in ['p', 'e', 'f']) else ' only',
-                      'p': 'phone numbers', 'e': 'emails', 'f': 'faxes'}
+                      'y': 'similar names', 'p': 'phone numbers', 'e': 'emails', 'f': 'faxes'}
         match_options = ', '.join([v for k, v in match_dict.items() if k in self.options])
         drop_option = "Attempt" if 'd' in self.options else "Do not attempt"
 
@@ -207,6 +273,7 @@ class Settings:
                 - p: match by phone number
                 - e: match by email
                 - f: match by fax
+                - y: also match similar names e.g. Müller and Mueller, or names with typos
                 - d: attempt to drop duplicate entries from customer database based on phone,
                      email, and fax number columns
                 - z: if 'd' enabled, also attempt to drop duplicates from primary database
@@ -0,0 +1,48 @@
+import logging
+import os
+import shutil
+import sys
+from glob import glob
+from os.path import join
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+
+class Spill:
+    """Partial results written to disk as pickle files, one file per part, and concatenated when loaded
+
+    Used when streaming large customer databases so only the current chunk's results are held in memory."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.parts = {}
+
+        # clear any results left over from an interrupted run
+        shutil.rmtree(self.folder, ignore_errors=True)
+        os.makedirs(self.folder)
+        logger.debug(f'Spilling partial results to {self.folder}')
+
+    def append(self, **dfs):
+        """write the next part for each named dataframe"""
+        for name, df in dfs.items():
+            part = self.parts.get(name, 0)
+            df.to_pickle(join(self.folder, f'{name}_{part:05d}.pkl'))
+            self.parts[name] = part + 1
+
+    def load(self, name):
+        """concatenate all parts written for a named dataframe in the order they were written"""
+        paths = sorted(glob(join(self.folder, f'{name}_*.pkl')))
+        if len(paths) == 0:
+            return pd.DataFrame()
+
+        return pd.concat([pd.read_pickle(path) for path in paths], ignore_index=True)
+
+    def remove(self):
+        """delete all spilled parts"""
+        shutil.rmtree(self.folder, ignore_errors=True)
@@ -0,0 +1,118 @@
+import logging
+import os
+import sys
+from os.path import exists, join, splitext
+from time import sleep
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# seconds between checks of the input folder
+INTERVAL = 5
+
+
+class Watcher:
+    """Match customer databases as they are added to the input folder, keeping the primary database loaded
+
+    Files are processed once their size and modification time are unchanged between two checks of the folder, so
+    files still being copied are not read, and processed again if changed later. The primary database is only
+    reloaded when it changes, from the index cache if its contents are unchanged."""
+
+    def __init__(self, pipeline, interval=INTERVAL):
+        """:param pipeline: pipeline matching and exporting each file
+        :param interval: seconds between checks of the input folder"""
+        self.pipeline = pipeline
+        self.interval = interval
+
+        # size and modification time of each file when processed, and of new or changed files when last checked
+        self.seen = {}
+        self.pending = {}
+
+        # customer files skipped or failed
+        self.failed = []
+
+    def scan(self):
+        """size and modification time of each csv and excel file in the input folder"""
+        files = {}
+        with os.scandir(self.pipeline.matcher.input_path) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(('.csv', '.xlsx')) and not entry.name.startswith('~$'):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+
+        # excel files are only read if not already saved as csv
+        return {name: signature for name, signature in files.items()
+                if not name.endswith('.xlsx') or splitext(name)[0] + '.csv' not in files}
+
+    def get_ready(self, files):
+        """files new or changed since processed, and unchanged since the last check"""
+        self.seen = {name: signature for name, signature in self.seen.items() if name in files}
+        ready = sorted(name for name, signature in files.items()
+                       if self.seen.get(name) != signature and self.pending.get(name) == signature)
+        self.pending = {name: signature for name, signature in files.items() if self.seen.get(name) != signature}
+        return ready
+
+    def mark_seen(self, filename):
+        """record a file as processed, with the csv saved from an excel file if enabled"""
+        for name in {filename, splitext(filename)[0] + '.csv'}:
+            filepath = join(self.pipeline.matcher.input_path, name)
+            if exists(filepath):
+                stat = os.stat(filepath)
+                self.seen[name] = (stat.st_size, stat.st_mtime_ns)
+            self.pending.pop(name, None)
+
+    def poll(self):
+        """check the input folder once, reloading the primary database if changed and processing the customer files
+        ready
+
+        :return: number of customer files processed"""
+        ready = self.get_ready(self.scan())
+
+        primary = self.pipeline.primary
+        if primary in ready:
+            ready.remove(primary)
+            if self.pipeline.index is not None:
+                logger.info(f'Primary database {primary} changed, reloading...\n')
+            try:
+                self.pipeline.load()
+            except Exception:  # keep the previous primary database, retried once changed again
+                logger.exception(f'ERROR: Could not load primary database {primary}')
+            self.mark_seen(primary)
+
+        if self.pipeline.index is None:  # customer files wait for the primary database
+            logger.debug(f'Primary database not loaded, waiting to process: {ready}')
+            return 0
+
+        processed = 0
+        for filename in ready:
+            try:
+                if self.pipeline.process(filename):
+                    processed += 1
+                else:
+                    self.failed.append(filename)
+            except Exception:  # isolate failures so one file doesn't stop the service
+                logger.exception(f'ERROR: Skipping {filename} - processing failed')
+                self.failed.append(filename)
+            self.mark_seen(filename)
+
+        if processed > 0:
+            logger.info(f'Watching for customer databases in {self.pipeline.matcher.input_path}...\n')
+        return processed
+
+    def run(self):
+        """check the input folder for new or changed files until stopped by Ctrl+C"""
+        logger.info(f'Watching for customer databases in {self.pipeline.matcher.input_path}, checking every '
+                    f'{self.interval}s (Ctrl+C to stop)\n')
+        if not exists(join(self.pipeline.matcher.input_path, self.pipeline.primary)):
+            logger.warning(f'Primary database {self.pipeline.primary} not found, customer databases are processed '
+                           f'once it is added to the input folder\n')
+
+        try:
+            while True:
+                self.poll()
+                sleep(self.interval)
+        except KeyboardInterrupt:
+            logger.info('Stopped watching input folder\n')
@@ -0,0 +1,89 @@
+import json
+import logging
+import re
+import sys
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+stdout_handler = logging.StreamHandler(stream=sys.stdout)
+stdout_handler.setLevel(logging.INFO)
+logger.addHandler(stdout_handler)
+
+# number of rows converted from a dataframe at once
+CHUNKSIZE = 10_000
+
+# header style used by pandas when writing excel files
+THIN = Side(style='thin')
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=THIN, right=THIN, top=THIN, bottom=THIN)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+
+
+def get_header(ws, columns):
+    """header row of bold, bordered cells as pandas writes it"""
+    cells = []
+    for column in columns:
+        cell = WriteOnlyCell(ws, value=str(column))
+        cell.font, cell.border, cell.alignment = HEADER_FONT, HEADER_BORDER, HEADER_ALIGNMENT
+        cells.append(cell)
+    return cells
+
+
+def get_rows(df, chunksize=CHUNKSIZE):
+    """rows of a dataframe as tuples of python values, converting one chunk at a time, with empty values as None"""
+    for start in range(0, len(df), chunksize):
+        chunk = df.iloc[start:start + chunksize].astype(object)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def write_excel(filepath, sheets, index=False):
+    """write dataframes to the sheets of an excel file in write-only mode, streaming rows to disk as they are
+    converted so memory use doesn't grow with the number of rows
+
+    :param sheets: dict of sheet names to dataframes
+    :param index: write the dataframe index as the first columns, as pandas does"""
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        if index:
+            df = df.reset_index()
+
+        ws = wb.create_sheet(title=name)
+        ws.append(get_header(ws, df.columns))
+        for row in get_rows(df):
+            ws.append(row)
+
+    wb.save(filepath)
+
+
+def get_slug(name):
+    """file name for a sheet name, e.g. 'Perfect Mailing List' to 'perfect_mailing_list'"""
+    return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def to_columnar(df):
+    """dataframe with string column names and object columns holding only strings, as columns mixing numbers and
+    strings, e.g. phone numbers, can't be stored as one type"""
+    df = df.rename(columns=str)
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def write_parquet(filepath, df):
+    """write a dataframe to a parquet file"""
+    to_columnar(df).to_parquet(filepath, index=False)
+
+
+def write_csv(filepath, df):
+    """write a dataframe to a ';' delimited csv file"""
+    df.to_csv(filepath, sep=';', index=False)
+
+
+def write_manifest(filepath, manifest):
+    """write the manifest of an export, listing its files and the rows and columns of each sheet"""
+    with open(filepath, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, ensure_ascii=False)
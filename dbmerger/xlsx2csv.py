@@ -32,8 +32,13 @@ import signal
 import sys
 import xml.parsers.expat
 import zipfile
+from operator import itemgetter
 from xml.dom import minidom
 
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv
+
 try:
     # python2.4
     from cStringIO import StringIO
@@ -131,10 +136,30 @@ CONTENT_TYPES = {
     'relationships',
 }
 
+# cell values which may be formatted as dates or numbers, for styles without a known format type
+DATE_NUMBER = re.compile(r"^\d+(\.\d+)?$")
+FLOAT_NUMBER = re.compile(r"^-?\d+(.\d+)?$")
+SCI_NUMBER = re.compile(r"^-?\d+(.\d+)?([eE]-?\d+)?$")
+
+# cell values read as empty, the same as when reading csv files with pyarrow
+NULL_VALUES = pa.array(pyarrow.csv.ConvertOptions().null_values, pa.string())
+
 DEFAULT_APP_PATH = "/xl"
 DEFAULT_WORKBOOK_PATH = DEFAULT_APP_PATH + "/workbook.xml"
 
 
+def get_dateformat(format_str):
+    """convert an excel date format to a strftime pattern"""
+    # ignore ";@", don't know what does it mean right now
+    # ignore "[$-409], [$-f409], [$-16001]" and similar format codes
+    return re.sub(r"\[\$\-[A-z0-9]*\]", "", format_str, 1) \
+        .replace(";@", "").replace("yyyy", "%Y").replace("yy", "%y") \
+        .replace("hh:mm", "%H:%M").replace("h", "%I").replace("%H%H", "%H") \
+        .replace("ss", "%S").replace("dddd", "d").replace("dd", "d").replace("d", "%d") \
+        .replace("am/pm", "%p").replace("mmmm", "%B").replace("mmm", "%b") \
+        .replace(":mm", ":%M").replace("m", "%m").replace("%m%m", "%m")
+
+
 def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
@@ -155,6 +180,11 @@ class OutFileAlreadyExistsException(XlsxException):
     pass
 
 
+class RowsRead(Exception):
+    """raised to stop parsing a sheet once all requested rows are read"""
+    pass
+
+
 class Xlsx2csv:
     """
      Usage: Xlsx2csv("test.xslx", **params).convert("test.csv", sheetid=1)
@@ -217,8 +247,9 @@ class Xlsx2csv:
             self.shared_strings.escape_strings()
 
     def __del__(self):
-        # make sure to close zip file, ziphandler does have a close() method
-        self.ziphandle.close()
+        # make sure to close zip file, ziphandler does have a close() method, unless it failed to open
+        if hasattr(self, 'ziphandle'):
+            self.ziphandle.close()
 
     def getSheetIdByName(self, name):
         for s in self.workbook.sheets:
@@ -279,7 +310,23 @@ class Xlsx2csv:
                         'lineterminator'])
                 self._convert(s['index'], of)
 
-    def _convert(self, sheet_index, outfile):
+    def read(self, sheetid=1, nrows=20, usecols=None, strings=(), outfile=None, rows=None):
+        """read a sheet straight into columns, detecting the header row in the same pass
+
+        :param usecols: names of columns to read, None for all columns
+        :param strings: names of columns kept as text rather than converted to numbers
+        :param outfile: path to file or filehandle to also write the sheet to as csv, None for no csv
+        :param rows: positions of the rows below the header to read, counting non-empty rows from 0, None for all rows.
+            Parsing stops after the last of them unless also writing csv
+        :return: arrow table of the sheet below its header row"""
+        columns = Columns(nrows, usecols, strings, rows=rows)
+        try:
+            self._convert(sheetid, outfile, columns)
+        except RowsRead:
+            pass
+        return columns.to_table()
+
+    def _convert(self, sheet_index, outfile, columns=None):
         closefile = False
         if isinstance(outfile, str):
             if sys.version_info[0] == 2:
@@ -291,8 +338,13 @@ class Xlsx2csv:
                 sys.exit(1)
             closefile = True
         try:
-            writer = csv.writer(outfile, quoting=self.options['quoting'], delimiter=self.options['delimiter'],
-                                lineterminator=self.options['lineterminator'])
+            writer = None
+            if outfile is not None:
+                writer = csv.writer(outfile, quoting=self.options['quoting'], delimiter=self.options['delimiter'],
+                                    lineterminator=self.options['lineterminator'])
+            if columns is not None:  # collect rows into columns, writing csv as a side output
+                columns.side = writer
+                writer = columns
 
             sheets_filtered = list(filter(lambda s: s['index'] == sheet_index, self.workbook.sheets))
             if len(sheets_filtered) == 0:
@@ -375,6 +427,107 @@ class Xlsx2csv:
         return instance
 
 
+class Columns:
+    """Rows of a sheet collected into one buffer per column, used as the csv writer of a Sheet
+
+    The header is the row with the most filled cells in the first rows, as detected for csv files.
+    Column names are made unique as pandas does, and values are only converted to numbers once all rows are read."""
+
+    def __init__(self, nrows=20, usecols=None, strings=(), side=None, rows=None):
+        self.nrows = nrows
+        self.usecols = usecols
+        self.strings = set(strings)
+        self.side = side
+        self.keep = None if rows is None else set(rows)
+        self.last = max(self.keep, default=-1) if rows is not None else None
+        self.count = 0
+        self.done = False
+
+        self.first = []
+        self.header = None
+        self.width = 0
+        self.get = None
+        self.rows = []
+
+    def writerow(self, row):
+        if self.side is not None:
+            self.side.writerow(row)
+
+        if self.header is None:  # hold first rows until the header is found
+            self.first.append(row)
+            if len(self.first) > self.nrows:
+                self.set_header()
+        else:
+            self.add(row)
+
+        if self.done and self.side is None:
+            raise RowsRead()
+
+    def add(self, row):
+        """keep the requested columns of a row below the header, if one of the requested rows"""
+        if len(row) == 0:  # empty lines are skipped as by the csv readers
+            return
+        position, self.count = self.count, self.count + 1
+        if self.keep is not None:
+            self.done = position >= self.last
+            if position not in self.keep:
+                return
+        if len(row) < self.width:
+            row = row + [''] * (self.width - len(row))
+        self.rows.append(self.get(row))
+
+    @staticmethod
+    def get_names(row):
+        """name empty columns by position and number repeated names, as pandas does for csv headers"""
+        names = []
+        for i, name in enumerate(row):
+            name = name if len(name) > 0 else 'Unnamed: %i' % i
+            base, count = name, 0
+            while name in names:
+                count += 1
+                name = '%s.%i' % (base, count)
+            names.append(name)
+        return names
+
+    def set_header(self):
+        """take the row with the most filled cells as header, and keep the requested columns of the rows after it"""
+        first, self.first = self.first, []
+        lengths = [len([value for value in row if len(value) > 0]) for row in first]
+        skip = lengths.index(max(lengths)) if len(lengths) > 0 else -1
+
+        self.header = self.get_names(first[skip]) if skip >= 0 else []
+        self.width = len(self.header)
+        keep = [i for i, name in enumerate(self.header) if self.usecols is None or name in self.usecols]
+        self.header = [self.header[i] for i in keep]
+        if len(keep) == 1:
+            self.get = lambda row: (row[keep[0]],)
+        else:
+            self.get = itemgetter(*keep) if len(keep) > 1 else lambda row: ()
+
+        for row in first[skip + 1:]:
+            self.add(row)
+
+    def to_table(self):
+        """convert each column to integers or floats if all its values are numbers, otherwise keep as text"""
+        if self.header is None:
+            self.set_header()
+
+        arrays = []
+        for name, values in zip(self.header, zip(*self.rows) if len(self.rows) > 0 else [()] * len(self.header)):
+            array = pa.array(values, pa.string())
+            array = pc.if_else(pc.is_in(array, value_set=NULL_VALUES), pa.scalar(None, pa.string()), array)
+            if name not in self.strings:
+                for type_ in [pa.int64(), pa.float64()]:
+                    try:
+                        array = array.cast(type_)
+                        break
+                    except pa.ArrowInvalid:
+                        continue
+            arrays.append(array)
+
+        return pa.table(arrays, names=self.header)
+
+
 class Workbook:
     def __init__(self):
         self.sheets = list()
@@ -513,6 +666,7 @@ class Styles:
     def __init__(self):
         self.numFmts = {}
         self.cellXfs = []
+        self.formats = []
 
     def parse(self, filehandle):
         styles = minidom.parseString(filehandle.read()).firstChild
@@ -545,6 +699,24 @@ class Styles:
                 else:
                     self.cellXfs.append(None)
 
+        self.formats = [self.get_format(numFmtId) for numFmtId in self.cellXfs]
+
+    def get_format(self, xfs_numfmt):
+        """resolve the format of a cell style once rather than for every cell
+
+        :return: format id, format string, format type or None if decided by the cell value,
+            whether values may be dates, and the strftime pattern for dates"""
+        format_str = "general"
+        if xfs_numfmt in self.numFmts:
+            format_str = self.numFmts[xfs_numfmt]
+        elif xfs_numfmt in STANDARD_FORMATS:
+            format_str = STANDARD_FORMATS[xfs_numfmt]
+
+        format_type = FORMATS.get(format_str)
+        is_date = bool(format_type is None and re.match(".*[hsmdyY]", format_str)
+                       and not re.match('.*\\[.*[dmhys].*\\]', format_str))
+        return xfs_numfmt, format_str, format_type, is_date, get_dateformat(format_str)
+
     # When Unknown Numformat ID assign applyNumberFormat
     def chk_exists(self, numFmtId):
         xfs_numfmt = numFmtId
@@ -658,6 +830,10 @@ class Sheet:
         self.colIndex = 0
         self.colNum = ""
 
+        # formatting function for each cell style, built once options are set
+        self.formatters = []
+        self.general = None
+
     def close(self):
         # Make sure Worksheet is closed, parsers lib does not have a close() function, so simply delete it
         self.parser = None
@@ -769,7 +945,97 @@ class Sheet:
             for cell in self._range(ref):
                 self.hyperlinks[cell] = target
 
+    def get_converter(self, format_type, format_str, dateformat):
+        """build the function converting a cell value of one format type, or None if left as is"""
+        if format_type == 'date' and self.dateformat == 'float':
+            format_type = "float"
+        if format_type in self.ignore_formats:
+            return None
+
+        if format_type == 'date':  # date/time
+            start = datetime.datetime(1904, 1, 1) if self.workbook.date1904 else datetime.datetime(1899, 12, 30)
+            # str(dateformat) - python2.5 bug, see: http://bugs.python.org/issue2782
+            pattern = str(self.dateformat) if self.dateformat else dateformat
+            strip = not self.dateformat
+
+            def convert(data):
+                data = (start + datetime.timedelta(float(data))).strftime(pattern)
+                return data.strip() if strip else data
+
+        elif format_type == 'time':  # time
+            def convert(data):
+                t = int(round((float(data) % 1) * 24 * 60 * 60, 6))  # it should be in seconds
+                d = datetime.time(int((t // 3600) % 24), int((t // 60) % 60), int(t % 60))
+                return d.strftime(self.timeformat)
+
+        elif format_type == 'float':
+            sci_format = str(self.floatformat or '%f')
+            if format_str != 'general' and format_str[0:3] == '0.0':
+                if self.floatformat:
+                    float_format = str(self.floatformat)
+                else:
+                    L = len(format_str.split(".")[1])
+                    if '%' in format_str:
+                        L += 1
+                    float_format = "%." + str(L) + "f"
+
+                def convert(data):
+                    if 'E' in data or 'e' in data:
+                        return sci_format % float(data)
+                    return float_format % float(data)
+            else:
+                # if cell is general or unsupported, be aggressive about stripping any trailing 0s, decimal points, etc.
+                def convert(data):
+                    if 'E' in data or 'e' in data:
+                        return sci_format % float(data)
+                    return ("%f" % (float(data))).rstrip('0').rstrip('.')
+        else:
+            return None
+
+        return convert
+
+    def get_formatter(self, xfs_numfmt, format_str, format_type, is_date, dateformat):
+        """build the function formatting the values of numeric cells of one style"""
+        if not format_str:
+            def unknown(data):
+                eprint("unknown format %s at %d" % (format_str, xfs_numfmt))
+                return data
+
+            return unknown
+
+        if format_type is not None:
+            convert = self.get_converter(format_type, format_str, dateformat)
+            if convert is None:
+                return lambda data: data
+            converters = None
+        else:  # type decided by the value of each cell
+            converters = {t: self.get_converter(t, format_str, dateformat) for t in ['date', 'time', 'float']}
+
+        def format(data):
+            if converters is None:
+                func = convert
+            elif is_date and DATE_NUMBER.match(data):
+                # it must be date format
+                func = converters['time'] if float(data) < 1 else converters['date']
+            elif FLOAT_NUMBER.match(data) or (self.scifloat and SCI_NUMBER.match(data)):
+                func = converters['float']
+            else:
+                return data
+
+            if func is None:
+                return data
+            try:
+                return func(data)
+            except (ValueError, OverflowError):  # this catch must be removed, it's hiding potential problems
+                eprint("Error: potential invalid date format.")
+                # invalid date format
+                return data
+
+        return format
+
     def to_csv(self, writer):
+        self.formatters = [self.get_formatter(*fmt) for fmt in self.styles.formats]
+        self.general = self.get_formatter(*self.styles.get_format(None))
         self.writer = writer
         self.parser = xml.parsers.expat.ParserCreate()
         self.parser.buffer_text = True
@@ -783,98 +1049,19 @@ class Sheet:
 
     def handleCharData(self, data):
         if self.in_cell_value:
-            format_type = None
-            format_str = "general"
             self.collected_string += data
             self.data = self.collected_string
             if self.colType == "s":  # shared string
-                format_type = "string"
                 self.data = self.sharedStrings[int(self.data)]
             elif self.colType == "b":  # boolean
-                format_type = "boolean"
                 self.data = (int(data) == 1 and "TRUE") or (int(data) == 0 and "FALSE") or data
             elif self.colType == "str" or self.colType == "inlineStr":
-                format_type = "string"
                 self.data = data
             elif self.s_attr:
                 s = int(self.s_attr)
-
-                # get cell format
-                xfs_numfmt = None
-                if s < len(self.styles.cellXfs):
-                    xfs_numfmt = self.styles.cellXfs[s]
-                if xfs_numfmt in self.styles.numFmts:
-                    format_str = self.styles.numFmts[xfs_numfmt]
-                elif xfs_numfmt in STANDARD_FORMATS:
-                    format_str = STANDARD_FORMATS[xfs_numfmt]
-
-                # get format type
-                if not format_str:
-                    eprint("unknown format %s at %d" % (format_str, xfs_numfmt))
-                    return
-
-                if format_str in FORMATS:
-                    format_type = FORMATS[format_str]
-                elif re.match("^\d+(\.\d+)?$", self.data) and re.match(".*[hsmdyY]", format_str) and not re.match(
-                        '.*\[.*[dmhys].*\]', format_str):
-                    # it must be date format
-                    if float(self.data) < 1:
-                        format_type = "time"
-                    else:
-                        format_type = "date"
-                elif re.match("^-?\d+(.\d+)?$", self.data) or (
-                        self.scifloat and re.match("^-?\d+(.\d+)?([eE]-?\d+)?$", self.data)):
-                    format_type = "float"
-                if format_type == 'date' and self.dateformat == 'float':
-                    format_type = "float"
+                self.data = (self.formatters[s] if s < len(self.formatters) else self.general)(self.data)
             elif self.colType == "n":
-                format_type = "float"
-
-            if format_type and not format_type in self.ignore_formats:
-                try:
-                    if format_type == 'date':  # date/time
-                        if self.workbook.date1904:
-                            date = datetime.datetime(1904, 1, 1) + datetime.timedelta(float(self.data))
-                        else:
-                            date = datetime.datetime(1899, 12, 30) + datetime.timedelta(float(self.data))
-                        if self.dateformat:
-                            # str(dateformat) - python2.5 bug, see: http://bugs.python.org/issue2782
-                            self.data = date.strftime(str(self.dateformat))
-                        else:
-                            # ignore ";@", don't know what does it mean right now
-                            # ignore "[$-409], [$-f409], [$-16001]" and similar format codes
-                            dateformat = re.sub(r"\[\$\-[A-z0-9]*\]", "", format_str, 1) \
-                                .replace(";@", "").replace("yyyy", "%Y").replace("yy", "%y") \
-                                .replace("hh:mm", "%H:%M").replace("h", "%I").replace("%H%H", "%H") \
-                                .replace("ss", "%S").replace("dddd", "d").replace("dd", "d").replace("d", "%d") \
-                                .replace("am/pm", "%p").replace("mmmm", "%B").replace("mmm", "%b") \
-                                .replace(":mm", ":%M").replace("m", "%m").replace("%m%m", "%m")
-                            self.data = date.strftime(str(dateformat)).strip()
-                    elif format_type == 'time':  # time
-                        t = int(round((float(self.data) % 1) * 24 * 60 * 60, 6))  # it should be in seconds
-                        d = datetime.time(int((t // 3600) % 24), int((t // 60) % 60), int(t % 60))
-                        self.data = d.strftime(self.timeformat)
-                    elif format_type == 'float' and ('E' in self.data or 'e' in self.data):
-                        self.data = str(self.floatformat or '%f') % float(self.data)
-                    # if cell is general, be aggressive about stripping any trailing 0s, decimal points, etc.
-                    elif format_type == 'float' and format_str == 'general':
-                        self.data = ("%f" % (float(self.data))).rstrip('0').rstrip('.')
-                    elif format_type == 'float' and format_str[0:3] == '0.0':
-                        if self.floatformat:
-                            self.data = str(self.floatformat) % float(self.data)
-                        else:
-                            L = len(format_str.split(".")[1])
-                            if '%' in format_str:
-                                L += 1
-                            self.data = ("%." + str(L) + "f") % float(self.data)
-                    elif format_type == 'float':
-                        # unsupported float formatting
-                        self.data = ("%f" % (float(self.data))).rstrip('0').rstrip('.')
-
-                except (ValueError, OverflowError):  # this catch must be removed, it's hiding potential problems
-                    eprint("Error: potential invalid date format.")
-                    # invalid date format
-                    pass
+                self.data = self.general(self.data)
 
     def handleStartElement(self, name, attrs):
         has_namespace = name.find(":") > 0
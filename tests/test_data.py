@@ -0,0 +1,40 @@
+"""Tests of loading databases from the input folder
+
+Usage: python -m unittest discover tests
+"""
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+import pandas as pd
+
+from test_match import get_match
+
+
+class TestGetRows(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.match = get_match(self.folder, ['n', 'p', 'c', 'q'])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_contact_columns_keep_leading_zeros(self):
+        """full customer rows keep phone numbers as written, converting only other columns to numbers"""
+        customer = pd.DataFrame({'Vorname': ['Anna', 'Peter', 'Hans'], 'Nachname': ['Schulz', 'Koch', 'Meyer'],
+                                 'Phone': ['06908092', '0301234567', '07123'], 'Fax': ['05743488', '', '0301'],
+                                 'Zip': ['10115', '14467', '20095']})
+        customer.to_csv(join(self.match.input_path, 'customer.csv'), sep=';', index=False)
+
+        df = self.match.get_rows('customer.csv', [0, 2])
+
+        self.assertEqual(df['cust_index'].tolist(), [0, 2])
+        self.assertEqual(df['Phone'].tolist(), ['06908092', '07123'])
+        self.assertEqual(df['Fax'].tolist(), ['05743488', '0301'])
+        self.assertEqual(df['Zip'].tolist(), [10115, 20095])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+"""Tests of matching customer databases against the primary database
+
+Usage: python -m unittest discover tests
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from os.path import abspath, dirname, join
+
+import pandas as pd
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+from dbmerger.match import Match  # noqa: E402
+from dbmerger.settings import Settings  # noqa: E402
+
+logging.disable(logging.CRITICAL)
+
+
+def get_match(folder, options):
+    """Match object with the default settings from settings.bak and all folders in a temporary folder"""
+    shutil.copyfile(join(ROOT, 'settings.bak'), join(folder, 'settings.txt'))
+    with open(join(folder, 'areas.txt'), 'w', encoding='utf-8') as file:
+        file.write('Allgemeinmedizin: general\n')
+
+    settings = Settings.__new__(Settings)
+    settings.filepath, settings.folder = join(folder, 'settings.txt'), folder
+    settings = settings.load_settings()
+    settings.update(options=options, open='', input=join(folder, 'input'), check=join(folder, 'check'),
+                    final=join(folder, 'final'), cache=join(folder, 'cache'))
+    os.makedirs(settings['input'])
+    return Match(settings)
+
+
+class TestSelectMatches(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.match = get_match(self.folder, ['n', 'p', 'e', 'a', 'q'])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def get_matches(self, primary, customer):
+        """write both databases to the input folder, load and match them"""
+        primary.to_csv(join(self.match.input_path, 'primary_database.csv'), sep=';', index=False)
+        customer.to_csv(join(self.match.input_path, 'customer.csv'), sep=';', index=False)
+        with redirect_stdout(StringIO()):
+            prim_main, prim_copy = self.match.get_df('primary_database.csv', kind='primary')
+            cust_main, cust_copy = self.match.get_df('customer.csv', kind='cust')
+            return self.match.get_matches(prim_copy, cust_copy, prim_main, cust_main)
+
+    def test_perfect_match_keeps_row_matched_on_contacts(self):
+        """of two customer rows with the same name, the one matching on contact data is the perfect match, also when
+        other matches are decided by areas"""
+        primary = pd.DataFrame({'TID': [1, 2], 'Vorname': ['Anna', 'Peter'], 'Nachname': ['Schulz', 'Koch'],
+                                'Telefon-Festnetz (beruflich)': ['030 1234567', '030 7654321'],
+                                'Allgemeinmedizin': [0, 1]})
+        customer = pd.DataFrame({'Vorname': ['Anna', 'Anna', 'Peter'], 'Nachname': ['Schulz', 'Schulz', 'Koch'],
+                                 'Phone': ['030 9999999', '030 1234567', '030 5555555'],
+                                 'Person Fachgebiet 1': ['', '', 'general']})
+
+        same, diff, none = self.get_matches(primary, customer)
+
+        pairs = dict(zip(same['TID'], same['cust_index']))
+        self.assertEqual(pairs, {1: 1, 2: 2})
+        self.assertEqual(len(diff) + len(none), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()